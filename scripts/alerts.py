@@ -0,0 +1,53 @@
+from datetime import datetime
+
+import queries
+
+
+class AbsenceAlerts:
+    # Checked right after a student marks an absence: one counter lookup per
+    # touched lecture against the max_absent computed at import, instead of
+    # anyone having to ask. Thresholds are remaining allowances (1 = one
+    # absence left, 0 = limit reached, -1 = limit exceeded); each fires at
+    # most once per (user, lecture), recorded in absence_alerts.
+
+    def __init__(self, pool, schedule, thresholds=(1, 0, -1)):
+        self.pool = pool
+        self.schedule = schedule
+        self.thresholds = sorted(set(thresholds), reverse=True)
+
+    async def check(self, user_id, lecture_ids):
+        # Returns (lecture_id, threshold, remaining) for every alert to send now
+        crossed = {}
+
+        async with self.pool.read() as db:
+            for lecture_id in lecture_ids:
+                max_absent = self.schedule.max_absent.get(lecture_id)
+                if max_absent is None:
+                    continue
+
+                async with db.execute(queries.LECTURE_MISSED, (user_id, lecture_id)) as cursor:
+                    row = await cursor.fetchone()
+
+                remaining = max_absent - (row['missed'] if row else 0)
+                hit = [t for t in self.thresholds if remaining <= t]
+                if hit:
+                    crossed[lecture_id] = (hit, remaining)
+
+        if not crossed:
+            return []
+
+        # Every threshold passed is recorded, but only the most severe new one
+        # is sent: jumping from 3 left to 0 left says "limit reached" once
+        alerts = []
+        fired_at = datetime.now().isoformat(timespec="seconds")
+        async with self.pool.write() as db:
+            for lecture_id, (hit, remaining) in crossed.items():
+                new = []
+                for threshold in hit:
+                    cursor = await db.execute(queries.RECORD_ABSENCE_ALERT, (user_id, lecture_id, threshold, fired_at))
+                    if cursor.rowcount:
+                        new.append(threshold)
+                if new:
+                    alerts.append((lecture_id, min(new), remaining))
+
+        return alerts
@@ -1,51 +1,100 @@
 import asyncio
-import aiosqlite  
 import logging
 import os
+import signal
+import sqlite3
 from dotenv import load_dotenv
 from datetime import datetime,timedelta
 from aiogram import Bot, Dispatcher, types, F
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.types import InlineKeyboardButton,ReplyKeyboardMarkup,KeyboardButton
-from aiogram_calendar import SimpleCalendar, SimpleCalendarCallback
-from aiogram.filters.callback_data import CallbackData
+from aiogram.exceptions import TelegramBadRequest
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from db_pool import DatabasePool
+from migrations import migrate
+import queries
+from schedule_cache import ScheduleCache
+from program_cache import ProgramCache
+from outbox import OutboxSender
+from reminders import ReminderIndex, parse_time, format_minute
+from alerts import AbsenceAlerts
+from schedule_changes import ScheduleChangeFeed, ADDED, MOVED, CANCELLED, RENAMED
+from attendance_calendar import AttendanceDays, render_month, clamp_month, MONTH_PREFIX, DAY_PREFIX, NOOP
+from write_buffer import AttendanceWriteBuffer
+from webhook import run_webhook
+from metrics import Metrics, instrument, start_server, dump
 
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-database_path = os.path.join(BASE_DIR, "database", "lectureflow.db") #
 
 load_dotenv()
 API_TOKEN = os.getenv("API_TOKEN")
+database_path = os.getenv("DATABASE_PATH") or os.path.join(BASE_DIR, "database", "lectureflow.db")
+
+# "polling" (default) or "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")          # public base URL, set with Telegram if given
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_CONCURRENCY = int(os.getenv("WEBHOOK_CONCURRENCY", "32"))
+
+# Users who did not pick a reminder time are spread over REMINDER_JITTER
+# minutes from REMINDER_TIME; the missing-attendance warning likewise over
+# MISSING_JITTER minutes from MISSING_CHECK_TIME
+REMINDER_TIME = parse_time(os.getenv("REMINDER_TIME", "18:30"))
+REMINDER_JITTER = int(os.getenv("REMINDER_JITTER", "30"))
+MISSING_CHECK_TIME = parse_time(os.getenv("MISSING_CHECK_TIME", "23:00"))
+MISSING_JITTER = int(os.getenv("MISSING_JITTER", "20"))
+
+# Remaining absence allowances that trigger an alert: 1 = one hour left,
+# 0 = limit reached, -1 = limit exceeded
+ABSENCE_ALERTS = [int(t) for t in os.getenv("ABSENCE_ALERTS", "1,0,-1").split(",") if t.strip()]
+
+# Prometheus text at http://METRICS_HOST:METRICS_PORT/metrics (port 0 turns it
+# off); SIGUSR1 writes the same text to METRICS_DUMP, or to the log
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+METRICS_DUMP = os.getenv("METRICS_DUMP")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
 
 logging.basicConfig(level=logging.INFO)
 
 bot = Bot(token=API_TOKEN)
 dp = Dispatcher()
 
-calendar = SimpleCalendar(show_alerts=True)
+metrics = Metrics(slow_query=SLOW_QUERY_MS / 1000)
+instrument(metrics, dp, bot)
+
+db_pool = DatabasePool(database_path, metrics=metrics)
+schedule = ScheduleCache()
+attendance_writes = AttendanceWriteBuffer(db_pool)
+outbox = OutboxSender(db_pool, bot)
+reminders = ReminderIndex(REMINDER_TIME, REMINDER_JITTER)
+scheduler = AsyncIOScheduler(timezone="Europe/Istanbul")
+absence_alerts = AbsenceAlerts(db_pool, schedule, ABSENCE_ALERTS)
+attendance_days = AttendanceDays(db_pool, schedule)
+schedule_changes = ScheduleChangeFeed(db_pool)
 
 # --- Basic Functions --- 
-async def get_todays_lessons(date_str):
+def get_todays_lessons(date_str):
+    return schedule.lessons_on(date_str)
 
-    async with aiosqlite.connect(database_path) as db:
-        
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            "SELECT lesson_id,lecture_name,time FROM lessons WHERE date = ?",(date_str,)
-        ) as cursor:
-            return await cursor.fetchall()
-        
-async def save_attendance(user_id,lesson_id,status):
 
-    async with aiosqlite.connect(database_path) as db:
+async def refresh_schedule():
+    async with db_pool.read() as db:
+        reloaded = await schedule.refresh(db)
 
-        await db.execute(
-            "INSERT OR REPLACE INTO attendance (user_id, lesson_id, status) VALUES (?, ?, ?)",(user_id,lesson_id,status)
-        )
+    if reloaded:
+        await warm_programs()
+        await notify_schedule_changes()
 
-        await db.commit()
+
+async def save_attendance(user_id,lesson_id,status):
+    await attendance_writes.submit(user_id, lesson_id, status)
+    attendance_days.mark(user_id, [lesson_id])
 
 # --- Basis Functions ---
 @dp.message(Command("start"))
@@ -53,12 +102,12 @@ async def cmd_start(message: types.Message):
     user_id = message.from_user.id
     user_name = message.from_user.first_name
 
-    async with aiosqlite.connect(database_path) as db:
-        await db.execute(
-            "INSERT OR IGNORE INTO users (user_id, username) VALUES (?, ?)",
-            (user_id, message.from_user.username)
-        )
-        await db.commit()
+    async with db_pool.write() as db:
+        async with db.execute(queries.REGISTER_USER, (user_id, message.from_user.username)) as cursor:
+            reminder_minute, enabled = await cursor.fetchone()
+
+    reminders.set(user_id, reminder_minute, enabled)
+    sync_reminder_jobs()
 
     
     kb = [
@@ -95,11 +144,11 @@ async def cmd_start(message: types.Message):
 
 @dp.message(F.text == "📅 Bugünün Programı")
 async def btn_today(message: types.Message):
-    await cmd_program_daily(message) 
+    await send_program(message, "today")
 
 @dp.message(F.text == "🔮 Yarınki Program")
 async def btn_tomorrow(message: types.Message):
-    await cmd_program_daily(message)
+    await send_program(message, "tomorrow")
 
 @dp.message(F.text == "📊 Genel Profilim")
 async def btn_profile(message: types.Message):
@@ -122,35 +171,87 @@ async def kalan_devamsizlik_hakki(message : types.Message):
 async def btn_help(message: types.Message):
     help_text = (
         "💡 <b>Küçük Bir İpucu:</b>\n\n"
-        "Her akşam saat <b>18:30</b>'da sana o günün yoklamasını girmen için hatırlatma yapacağım.\n\n"
-        "Eğer <b>23:00</b>'a kadar eksik girişin kalırsa seni tekrar uyaracağım. 😉"
+        f"Her akşam <b>{format_minute(REMINDER_TIME)}</b> civarında sana o günün yoklamasını girmen için hatırlatma yapacağım.\n\n"
+        f"Eğer <b>{format_minute(MISSING_CHECK_TIME)}</b>'a kadar eksik girişin kalırsa seni tekrar uyaracağım. 😉\n\n"
+        "⏰ Saati değiştirmek için: <code>/hatirlatma 20:15</code>\n"
+        "🔕 Hatırlatmaları kapatmak için: <code>/hatirlatma kapat</code>"
     )
     await message.answer(help_text, parse_mode="HTML")
 
 
+STATUS_ICONS = {1: "✅", 0: "❌", None: "▫️"}
+
+
+async def get_day_statuses(user_id, date_str):
+    async with db_pool.read() as db:
+        async with db.execute(queries.DAY_STATUSES, (user_id, date_str)) as cursor:
+            return {row['lesson_id']: row['status'] for row in await cursor.fetchall()}
+
+
+def render_attendance_sheet(date_str, lessons, statuses):
+    # The whole day as one message: a line per lesson showing its current
+    # state, a keyboard row per lesson and a final row to mark them all
+    lines = [f"🗓 {date_str} dersleri. Durumlarını işaretle:\n"]
+    builder = InlineKeyboardBuilder()
+
+    for lesson in lessons:
+        status = statuses.get(lesson.lesson_id)
+        start = lesson.time.split("-")[0]
+        lines.append(f"{STATUS_ICONS[status]} {lesson.time} - {lesson.lecture_name}")
+
+        builder.row(
+            InlineKeyboardButton(
+                text=f"{'• ' if status == 1 else ''}✅ {start}",
+                callback_data=f"att_{lesson.lesson_id}_1"
+            ),
+            InlineKeyboardButton(
+                text=f"{'• ' if status == 0 else ''}❌ {start}",
+                callback_data=f"att_{lesson.lesson_id}_0"
+            ),
+        )
+
+    builder.row(
+        InlineKeyboardButton(text="✅ Hepsine Girdim", callback_data=f"attall_{date_str}_1"),
+        InlineKeyboardButton(text="❌ Hiçbirine Girmedim", callback_data=f"attall_{date_str}_0"),
+    )
+
+    marked = sum(1 for lesson in lessons if lesson.lesson_id in statuses)
+    lines.append(f"\nİşaretlenen: {marked}/{len(lessons)}")
+
+    return "\n".join(lines), builder.as_markup()
+
+
+async def send_attendance_sheet(message: types.Message, user_id, date_str):
+    lessons = get_todays_lessons(date_str)
+    statuses = await get_day_statuses(user_id, date_str)
+    text, markup = render_attendance_sheet(date_str, lessons, statuses)
+    await message.answer(text, reply_markup=markup)
+
+
+async def refresh_attendance_sheet(message: types.Message, user_id, date_str):
+    lessons = get_todays_lessons(date_str)
+    statuses = await get_day_statuses(user_id, date_str)
+    text, markup = render_attendance_sheet(date_str, lessons, statuses)
+
+    try:
+        await message.edit_text(text, reply_markup=markup)
+    except TelegramBadRequest as e:
+        # Tapping the state that is already selected changes nothing
+        if "message is not modified" not in e.message:
+            raise
+
+
 @dp.message(Command("yoklama_bugun"))
 async def cmd_today(message: types.Message):
     
     today = datetime.now().strftime('%Y-%m-%d')
-    lessons = await get_todays_lessons(today)
+    lessons = get_todays_lessons(today)
     
     if not lessons:
         await message.answer("Bugün programında ders görünmüyor. Dinlenmene bak! ☕")
         return
 
-    await message.answer("🗓 Bugünün dersleri aşağıda. Durumlarını işaretle:")
-
-    for row in lessons:
-        
-        builder = InlineKeyboardBuilder()
-        
-        builder.add(InlineKeyboardButton(text="✅ Girdim", callback_data=f"att_{row['lesson_id']}_1"))
-        builder.add(InlineKeyboardButton(text="❌ Girmedim", callback_data=f"att_{row['lesson_id']}_0"))
-        
-        await message.answer(
-            f"📍 {row['time']} - {row['lecture_name']}",
-            reply_markup=builder.as_markup()
-        )
+    await send_attendance_sheet(message, message.from_user.id, today)
 
 
 
@@ -161,68 +262,106 @@ async def handle_attendance_button(callback: types.CallbackQuery):
     lesson_id = int(data_parts[1])
     status = int(data_parts[2])
 
-    
+    lesson = schedule.get(lesson_id)
+    if lesson is None:
+        await callback.answer("Bu ders artık programda bulunmuyor.")
+        return
+
     await save_attendance(callback.from_user.id, lesson_id, status)
-    
-    
-    sonuc = "✅ GİRDİN" if status == 1 else "❌ GİRMEDİN"
-    
-    
-    await callback.message.edit_text(
-        f"{callback.message.text}\n\nKayıt: {sonuc}"
-    )
+    await refresh_attendance_sheet(callback.message, callback.from_user.id, lesson.date)
     
     await callback.answer("Yoklama başarıyla işlendi.")
 
+    if status == 0:
+        await send_absence_alerts(callback.message, callback.from_user.id, [lesson.lecture_id])
+
+
+@dp.callback_query(F.data.startswith("attall_"))
+async def handle_attendance_all(callback: types.CallbackQuery):
+    
+    _, date_str, status = callback.data.split("_")
+    user_id = callback.from_user.id
+
+    lessons = get_todays_lessons(date_str)
+    rows = [(user_id, lesson.lesson_id, int(status)) for lesson in lessons]
+    if not rows:
+        await callback.answer("Bu tarihte ders bulunamadı.")
+        return
+
+    # All rows go into the same batch, so the day is written in one transaction
+    await attendance_writes.submit_many(rows)
+    attendance_days.mark(user_id, [lesson.lesson_id for lesson in lessons])
+    await refresh_attendance_sheet(callback.message, user_id, date_str)
+
+    await callback.answer("Günün yoklaması işlendi.")
+
+    if int(status) == 0:
+        await send_absence_alerts(callback.message, user_id, {lesson.lecture_id for lesson in lessons})
+
+
+def render_absence_alert(lecture_id, remaining):
+    name = schedule.lecture_names.get(lecture_id, "")
+
+    if remaining > 0:
+        return f"⚠️ *{name}* dersinde yalnızca *{remaining}* saat devamsızlık hakkın kaldı."
+    if remaining == 0:
+        return f"🚫 *{name}* dersinde devamsızlık hakkın doldu. Bir saat daha kaçırırsan sınırı aşacaksın."
+    return f"🚨 *{name}* dersinde devamsızlık sınırını *{-remaining}* saat aştın!"
+
+
+async def send_absence_alerts(message: types.Message, user_id, lecture_ids):
+    for lecture_id, _, remaining in await absence_alerts.check(user_id, lecture_ids):
+        await message.answer(render_absence_alert(lecture_id, remaining), parse_mode="Markdown")
+
 
 @dp.message(Command("yoklama_tarih"))
 async def yoklama_tarih(message: types.Message):
+    index, completed = await attendance_days.days(message.from_user.id)
 
-    await message.answer(
-        "📅 **Lütfen yoklamasını doldurmak istediğiniz tarihi seçin:**",
-        reply_markup=await SimpleCalendar().start_calendar(),
-        parse_mode="Markdown"
-    )
+    if not index.dates:
+        await message.answer("ℹ️ Programda henüz ders bulunmuyor.")
+        return
+
+    today = datetime.now().strftime("%Y-%m-%d")
+    text, markup = render_month(index, completed, clamp_month(index, today[:7]), today)
+    await message.answer(text, reply_markup=markup, parse_mode="Markdown")
 
 
+@dp.callback_query(F.data.startswith(MONTH_PREFIX))
+async def process_calendar_month(callback: types.CallbackQuery):
+    index, completed = await attendance_days.days(callback.from_user.id)
 
-@dp.callback_query(SimpleCalendarCallback.filter())
-async def process_simple_calendar(callback_query: types.CallbackQuery, callback_data: CallbackData):
-    selected, date = await SimpleCalendar().process_selection(callback_query, callback_data)
-    
-    if selected:
-        formatted_date = date.strftime("%Y-%m-%d")
-        
-        async with aiosqlite.connect(database_path) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute(
-                "SELECT * FROM lessons WHERE date = ?", (formatted_date,)
-            ) as cursor:
-                lessons = await cursor.fetchall()
-
-        if not lessons:
-            await callback_query.message.answer(f"ℹ️ `{formatted_date}` tarihinde herhangi bir ders bulunamadı.")
-            return
+    if not index.dates:
+        await callback.answer("Programda ders bulunmuyor.")
+        return
 
-        await callback_query.message.answer(
-            f"✅ `{formatted_date}` tarihi seçildi.\nŞimdi dersleri işaretleyebilirsiniz:",
-            parse_mode="Markdown"
-        )
-        
+    month = clamp_month(index, callback.data[len(MONTH_PREFIX):])
+    text, markup = render_month(index, completed, month, datetime.now().strftime("%Y-%m-%d"))
+
+    try:
+        await callback.message.edit_text(text, reply_markup=markup, parse_mode="Markdown")
+    except TelegramBadRequest as e:
+        if "message is not modified" not in e.message:
+            raise
+    await callback.answer()
+
+
+@dp.callback_query(F.data.startswith(DAY_PREFIX))
+async def process_calendar_day(callback: types.CallbackQuery):
+    date_str = callback.data[len(DAY_PREFIX):]
+
+    # Only lesson days are buttons, unless the schedule changed since
+    if not get_todays_lessons(date_str):
+        await callback.answer(f"{date_str} tarihinde ders bulunamadı.")
+        return
+
+    await send_attendance_sheet(callback.message, callback.from_user.id, date_str)
+    await callback.answer()
 
-        for lesson in lessons:
-            builder = InlineKeyboardBuilder()
-            
-            builder.add(
-                InlineKeyboardButton(text="✅ Geldim", callback_data=f"att_{lesson['lesson_id']}_1"),
-                InlineKeyboardButton(text="❌ Gelmedim", callback_data=f"att_{lesson['lesson_id']}_0")
-            )
-            builder.adjust(2)
-            
-            await callback_query.message.answer(
-                f"📍 {lesson['time']} - {lesson['lecture_name']}",
-            reply_markup=builder.as_markup()
-            )
+
+@dp.callback_query(F.data == NOOP)
+async def process_calendar_noop(callback: types.CallbackQuery):
+    await callback.answer()
 
 
 @dp.message(Command("kalan_hak"))
@@ -241,43 +380,21 @@ async def cmd_yoklama(message: types.Message):
 @dp.callback_query(F.data.startswith("sel_comm_"))
 async def process_committee_select(callback: types.CallbackQuery):
     committee_id = callback.data.split("_")[-1]
+    committee = None if committee_id == "none" else int(committee_id)
     
-    async with aiosqlite.connect(database_path) as db:
-        db.row_factory = aiosqlite.Row
-        
-        
-        if committee_id == "none":
-            query = """
-                SELECT lecture_name, type FROM lessons 
-                WHERE committee IS NULL 
-                GROUP BY lecture_name, type 
-                HAVING COUNT(*) > 0
-            """
-            params = ()
-        else:
-            query = """
-                SELECT lecture_name, type FROM lessons 
-                WHERE committee = ? 
-                GROUP BY lecture_name, type 
-                HAVING COUNT(*) > 0
-            """
-            params = (committee_id,)
-        
-        async with db.execute(query, params) as cursor:
-            lessons = await cursor.fetchall()
+    async with db_pool.read() as db:
+        async with db.execute(queries.LECTURES_BY_COMMITTEE, (committee,)) as cursor:
+            lectures = await cursor.fetchall()
 
-    if not lessons:
+    if not lectures:
         await callback.answer("Bu grupta aktif ders bulunamadı.")
         return
 
     builder = InlineKeyboardBuilder()
-    for row in lessons:
-        lecture_short = row['lecture_name'][:20]
-        
-        l_type = row['type'][0]
+    for row in lectures:
         builder.add(InlineKeyboardButton(
-            text=f"{row['lecture_name']}", 
-            callback_data=f"calc_{committee_id}_{lecture_short}_{l_type}")
+            text=f"{row['name']}", 
+            callback_data=f"calc_{row['lecture_id']}")
         )
     
     builder.adjust(1)
@@ -291,51 +408,25 @@ async def process_committee_select(callback: types.CallbackQuery):
 
 @dp.callback_query(F.data.startswith("calc_"))
 async def process_calculation(callback: types.CallbackQuery):
-    _, committee_id, lecture_prefix, l_type = callback.data.split("_")
+    lecture_id = int(callback.data.split("_")[1])
     user_id = callback.from_user.id
 
-    async with aiosqlite.connect(database_path) as db:
-        db.row_factory = aiosqlite.Row
-        
-        
-        if committee_id == "none":
-            total_sql = "SELECT COUNT(*) as total FROM lessons WHERE committee IS NULL AND lecture_name LIKE ?"
-            total_params = (f"{lecture_prefix}%",)
-            
-            missed_sql = """
-                SELECT COUNT(*) as missed FROM attendance a
-                JOIN lessons l ON a.lesson_id = l.lesson_id
-                WHERE a.user_id = ? AND l.committee IS NULL AND l.lecture_name LIKE ? AND a.status = 0
-            """
-            missed_params = (user_id, f"{lecture_prefix}%")
-        else:
-            total_sql = "SELECT COUNT(*) as total FROM lessons WHERE committee = ? AND lecture_name LIKE ?"
-            total_params = (committee_id, f"{lecture_prefix}%")
-            
-            missed_sql = """
-                SELECT COUNT(*) as missed FROM attendance a
-                JOIN lessons l ON a.lesson_id = l.lesson_id
-                WHERE a.user_id = ? AND l.committee = ? AND l.lecture_name LIKE ? AND a.status = 0
-            """
-            missed_params = (user_id, committee_id, f"{lecture_prefix}%")
-
-        async with db.execute(total_sql, total_params) as cursor:
-            total_row = await cursor.fetchone()
-            total_hours = total_row['total'] if total_row else 0
-
-        async with db.execute(missed_sql, missed_params) as cursor:
-            missed_row = await cursor.fetchone()
-            missed_hours = missed_row['missed'] if missed_row else 0
+    async with db_pool.read() as db:
+        async with db.execute(queries.LECTURE_STATUS, (user_id, lecture_id)) as cursor:
+            lecture = await cursor.fetchone()
 
-    
-    limit = 0.30 if l_type == "T" else 0.20
-    max_absent = int(total_hours * limit)
+    if lecture is None:
+        await callback.answer("Bu ders artık programda bulunmuyor.")
+        return
+
+    missed_hours = lecture['missed']
+    max_absent = lecture['max_absent']
     remaining = max_absent - missed_hours
 
 
     progress_bar = create_progress_bar(missed_hours,max_absent)
     result_text = (
-        f"📖 *{lecture_prefix.upper()}*\n"
+        f"📖 *{lecture['name'].upper()}*\n"
         f"━━━━━━━━━━━━━━\n"
         f"🎯 *Kalan Hak:* {remaining} Saat\n"
         f"📉 *Yaptığın Devamsızlık*: {missed_hours} Saat\n"
@@ -365,27 +456,26 @@ async def cmd_profil(message: types.Message):
     user_id = message.from_user.id
     current_date = datetime.now().strftime("%Y-%m-%d")
 
-    async with aiosqlite.connect(database_path) as db:
-        db.row_factory = aiosqlite.Row
-        
-       
-        query = """
-            SELECT 
-                l.lecture_name,
-                COUNT(l.lesson_id) as total_occurred,
-                SUM(CASE WHEN a.status = 1 THEN 1 ELSE 0 END) as attended_count
-            FROM lessons l
-            LEFT JOIN attendance a ON l.lesson_id = a.lesson_id AND a.user_id = ?
-            WHERE l.date <= ?
-            GROUP BY l.lecture_name
-            HAVING total_occurred > 0
-            ORDER BY l.lecture_name ASC
-        """
-        
-        async with db.execute(query, (user_id, current_date)) as cursor:
-            rows = await cursor.fetchall()
-
-    if not rows:
+    async with db_pool.read() as db:
+        async with db.execute(queries.USER_COUNTERS, (user_id,)) as cursor:
+            counters = {row['lecture_id']: row['attended'] for row in await cursor.fetchall()}
+        async with db.execute(queries.USER_UPCOMING_ATTENDED, (user_id, current_date)) as cursor:
+            for row in await cursor.fetchall():
+                counters[row['lecture_id']] = counters.get(row['lecture_id'], 0) - row['attended']
+
+    # Lectures sharing a name (e.g. the same course in two committees) are
+    # reported together, as before
+    totals = {}
+    for lecture_id, name in schedule.lecture_names.items():
+        occurred = schedule.occurred(lecture_id, current_date)
+        if occurred == 0:
+            continue
+
+        # Only lessons up to today count, like occurred
+        total, attended = totals.get(name, (0, 0))
+        totals[name] = (total + occurred, attended + min(counters.get(lecture_id, 0), occurred))
+
+    if not totals:
         await message.answer("ℹ️ Henüz işlenmiş bir ders kaydı veya girilmiş bir yoklama bulunamadı.")
         return
 
@@ -397,11 +487,7 @@ async def cmd_profil(message: types.Message):
     )
     
     report_body = ""
-    for row in rows:
-        lecture = row['lecture_name']
-        attended = row['attended_count'] if row['attended_count'] else 0
-        total = row['total_occurred']
-        
+    for lecture, (total, attended) in sorted(totals.items()):
         percentage = (attended / total) * 100
         bar = create_progress_bar(attended, total)
         
@@ -419,126 +505,278 @@ async def cmd_profil(message: types.Message):
     await message.answer(report_header + report_body + footer, parse_mode="Markdown")
 
 
-async def broadcast_reminder(bot: Bot):
+async def load_reminders():
+    async with db_pool.read() as db:
+        async with db.execute(queries.REMINDER_SETTINGS) as cursor:
+            reminders.load(await cursor.fetchall())
+
+    sync_reminder_jobs()
+    logging.info(f"Hatırlatmalar: {len(reminders.user_minute)} kullanıcı, {len(reminders.buckets)} dakika")
+
+
+def sync_reminder_jobs():
+    # One cron job per minute that has someone to remind
+    wanted = set(reminders.buckets)
+
+    for job in scheduler.get_jobs():
+        if job.id.startswith("reminder-") and int(job.id.split("-")[1]) not in wanted:
+            job.remove()
+
+    for minute in wanted:
+        job_id = f"reminder-{minute}"
+        if scheduler.get_job(job_id) is None:
+            scheduler.add_job(metrics.timed_job(send_reminder_bucket), "cron", hour=minute // 60, minute=minute % 60,
+                              args=[minute], id=job_id)
+
+
+async def send_reminder_bucket(minute):
     today_str = datetime.now().strftime("%Y-%m-%d")
 
-    todays_lessons = await get_todays_lessons(today_str)
-    
-    if not todays_lessons:
+    if not get_todays_lessons(today_str):
+        return
+
+    user_ids = reminders.due(minute)
+    if not user_ids:
         return
-    
-    async with aiosqlite.connect(database_path) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute("SELECT user_id FROM users") as cursor:
-            rows = await cursor.fetchall()
-            
-            for row in rows:
-                try:
-                    await bot.send_message(
-                        row['user_id'], 
-                        "⏰ Yoklama Saati: Bugünün derslerini girmeyi unutma!"
-                    )
-                except Exception as e:
-                    print(f"Hata: {row['user_id']} id'li kullanıcıya ulaşılamadı. {e}")
-
-
-async def check_missing_attendance(bot: Bot):
-    today = datetime.now().strftime("%Y-%m-%d")
-    
-    async with aiosqlite.connect(database_path) as db:
-        db.row_factory = aiosqlite.Row
-        
-        
-        async with db.execute("SELECT user_id FROM users") as cursor:
-            users = await cursor.fetchall()
-
-        for user in users:
-            uid = user['user_id']
-            
-            
-            query = """
-                SELECT 
-                    (SELECT COUNT(*) FROM lessons WHERE date = ?) as total,
-                    (SELECT COUNT(*) FROM attendance a 
-                     JOIN lessons l ON a.lesson_id = l.lesson_id 
-                     WHERE l.date = ? AND a.user_id = ?) as filled
-            """
-            async with db.execute(query, (today, today, uid)) as cursor:
-                res = await cursor.fetchone()
-                
-                
-                if res and res['total'] > 0 and res['filled'] < res['total']:
-                    await bot.send_message(
-                        uid,
-                        f"🚨 SON UYARI!\n\nBugün girmeyi unuttuğun `{res['total'] - res['filled']}` ders saati görünüyor.\n"
-                        "Veri kaybı yaşamamak için lütfen şimdi doldur! ⏳",
-                        parse_mode="Markdown"
-                    )
 
+    text = "⏰ Yoklama Saati: Bugünün derslerini girmeyi unutma!"
+    await outbox.enqueue("reminder", today_str, [(uid, text) for uid in user_ids], expires=today_str)
 
-@dp.message(Command("program_bugun"))
-@dp.message(Command("program_yarin"))
-async def cmd_program_daily(message: types.Message):
-    
-    is_tomorrow = "yarin" in message.text.lower()
-    target_date = datetime.now()
-    
-    if is_tomorrow:
-        target_date += timedelta(days=1)
-        label = "YARINKİ"
+
+@dp.message(Command("hatirlatma"))
+async def cmd_hatirlatma(message: types.Message, command: CommandObject):
+    user_id = message.from_user.id
+    arg = (command.args or "").strip().lower()
+
+    if not arg:
+        if reminders.enabled(user_id):
+            current = f"Hatırlatman her gün <b>{format_minute(reminders.user_minute[user_id])}</b>'da geliyor."
+        else:
+            current = "Hatırlatmaların kapalı."
+        await message.answer(
+            f"{current}\n\n"
+            "⏰ <code>/hatirlatma 20:15</code> — saati değiştir\n"
+            "🔁 <code>/hatirlatma varsayilan</code> — varsayılan saate dön\n"
+            "🔕 <code>/hatirlatma kapat</code> — hatırlatmaları kapat",
+            parse_mode="HTML"
+        )
+        return
+
+    if arg in ("kapat", "kapalı", "kapali"):
+        reminder_minute, enabled = None, 0
+    elif arg in ("varsayilan", "varsayılan"):
+        reminder_minute, enabled = None, 1
     else:
-        label = "BUGÜNKÜ"
-        
-    date_str = target_date.strftime("%Y-%m-%d")
+        reminder_minute, enabled = parse_time(arg), 1
+        if reminder_minute is None:
+            await message.answer("Saati SS:DD biçiminde yaz, örneğin /hatirlatma 20:15")
+            return
 
-    
-    async with aiosqlite.connect(database_path) as db:
-        db.row_factory = aiosqlite.Row
+    async with db_pool.write() as db:
+        cursor = await db.execute(queries.SET_REMINDER, (reminder_minute, enabled, user_id))
+        registered = cursor.rowcount > 0
+
+    if not registered:
+        await message.answer("Önce /start ile kaydolmalısın.")
+        return
+
+    minute = reminders.set(user_id, reminder_minute, enabled)
+    sync_reminder_jobs()
+
+    if minute is None:
+        await message.answer("🔕 Hatırlatmalar kapatıldı. Açmak için: /hatirlatma varsayilan")
+    else:
+        await message.answer(f"⏰ Hatırlatman artık her gün <b>{format_minute(minute)}</b>'da gelecek.", parse_mode="HTML")
+
+
+async def find_missing_attendance(start_date, end_date=None):
+    # {user_id: {date: missing lesson count}} for a day or a date range
+    end_date = end_date or start_date
+
+    async with db_pool.read() as db:
         async with db.execute(
-            "SELECT lecture_name, time FROM lessons WHERE date = ? ORDER BY time ASC", 
-            (date_str,)
+            queries.MISSING_ATTENDANCE, (start_date, end_date, start_date, end_date)
         ) as cursor:
-            lessons = await cursor.fetchall()
+            rows = await cursor.fetchall()
+
+    missing = {}
+    for row in rows:
+        missing.setdefault(row['user_id'], {})[row['date']] = row['missing']
+
+    return missing
+
+
+async def check_missing_attendance():
+    today = datetime.now().strftime("%Y-%m-%d")
+
+    missing = await find_missing_attendance(today)
+
+    messages = [
+        (
+            uid,
+            f"🚨 SON UYARI!\n\nBugün girmeyi unuttuğun `{days[today]}` ders saati görünüyor.\n"
+            "Veri kaybı yaşamamak için lütfen şimdi doldur! ⏳"
+        )
+        for uid, days in missing.items()
+        if reminders.enabled(uid)
+    ]
+
+    await outbox.enqueue("missing", today, messages, parse_mode="Markdown", spread=MISSING_JITTER * 60,
+                         expires=today)
+
+
+# A long change list is cut here to stay well within Telegram's message size
+MAX_CHANGE_LINES = 25
+
+
+def render_schedule_changes(changes):
+    lines = ["📢 Ders programında seni ilgilendiren değişiklikler var:", "━━━━━━━━━━━━━━"]
+
+    for row in changes[:MAX_CHANGE_LINES]:
+        if row['kind'] == MOVED:
+            lines.append(f"🔁 {row['new_name']}: {row['old_date']} {row['old_time']} → {row['new_date']} {row['new_time']}")
+        elif row['kind'] == RENAMED:
+            lines.append(f"✏️ {row['new_date']} {row['new_time']}: {row['old_name']} → {row['new_name']}")
+        elif row['kind'] == CANCELLED:
+            lines.append(f"❌ {row['old_date']} {row['old_time']} {row['old_name']} iptal edildi")
+        elif row['kind'] == ADDED:
+            lines.append(f"➕ {row['new_date']} {row['new_time']} {row['new_name']} eklendi")
+
+    if len(changes) > MAX_CHANGE_LINES:
+        lines.append(f"… ve {len(changes) - MAX_CHANGE_LINES} değişiklik daha")
+
+    lines.append("━━━━━━━━━━━━━━\n📅 Güncel program: /program_bugun, /program_yarin")
+    return "\n".join(lines)
+
+
+async def notify_schedule_changes():
+    # After an import: one message per affected user, through the outbox so
+    # a restart neither loses nor repeats it. The kind carries the last
+    # change id, which keeps two imports on the same day apart.
+    today = datetime.now().strftime("%Y-%m-%d")
+    last_change_id, per_user = await schedule_changes.pending(today)
+    if last_change_id is None:
+        return
+
+    messages = [(user_id, render_schedule_changes(changes)) for user_id, changes in per_user.items()]
+    if messages:
+        await outbox.enqueue(f"schedule_{last_change_id}", today, messages)
+
+    await schedule_changes.mark_notified(last_change_id)
+
+
+# The two program views: days after today and header label
+PROGRAM_VIEWS = {
+    "today": (0, "BUGÜNKÜ"),
+    "tomorrow": (1, "YARINKİ"),
+}
+
+
+def program_date(view, now=None):
+    days, _ = PROGRAM_VIEWS[view]
+    return ((now or datetime.now()) + timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+def render_program(date_str, view):
+    _, label = PROGRAM_VIEWS[view]
+    lessons = get_todays_lessons(date_str)
 
-    
     if not lessons:
-        await message.answer(
+        return (
             f"☕ <b>{label} PROGRAM</b>\n"
             f"━━━━━━━━━━━━━━\n"
-            f"Bu tarihte herhangi bir ders görünmüyor. Dinlenebilirsin! 🎉",
-            parse_mode="HTML"
+            f"Bu tarihte herhangi bir ders görünmüyor. Dinlenebilirsin! 🎉"
         )
-        return
 
-    
-    response = (
-        f"📅 <b>{label} DERS PROGRAMI</b>\n"
-        f"({date_str})\n"
-        f"━━━━━━━━━━━━━━\n"
-    )
+    lines = [
+        f"📅 <b>{label} DERS PROGRAMI</b>",
+        f"({date_str})",
+        "━━━━━━━━━━━━━━",
+    ]
 
-    
     for l in lessons:
-        
-        icon = "🧪" if "(P)" in l['lecture_name'].upper() else "📖"
-        response += f"⏰ {l['time']}| {icon} <b>{l['lecture_name']}</b>\n"
+        icon = "🧪" if "(P)" in l.lecture_name.upper() else "📖"
+        lines.append(f"⏰ {l.time}| {icon} <b>{l.lecture_name}</b>")
 
-    response += "━━━━━━━━━━━━━━\n📍 <i>İyi dersler dilerim!</i>"
-    
-    await message.answer(response, parse_mode="HTML")
+    lines.append("━━━━━━━━━━━━━━\n📍 <i>İyi dersler dilerim!</i>")
+
+    return "\n".join(lines)
+
+
+programs = ProgramCache(schedule, render_program)
+
+
+async def warm_programs():
+    now = datetime.now()
+    programs.warm(program_date("today", now), [(program_date(view, now), view) for view in PROGRAM_VIEWS])
+
+
+async def send_program(message: types.Message, view):
+    await message.answer(programs.get(program_date(view), view), parse_mode="HTML")
+
+
+@dp.message(Command("program_bugun"))
+@dp.message(Command("program_yarin"))
+async def cmd_program_daily(message: types.Message):
+    view = "tomorrow" if "yarin" in message.text.lower() else "today"
+    await send_program(message, view)
 
 
 async def main():
     
+    os.makedirs(os.path.dirname(database_path), exist_ok=True)
+    conn = sqlite3.connect(database_path)
+    migrate(conn)
+    conn.close()
+
+    await db_pool.open()
+
+    async with db_pool.read() as db:
+        await schedule.load(db)
+
+    await warm_programs()
+
+    attendance_writes.start()
+    outbox.start()
+
+    # Changes imported while the bot was down
+    await notify_schedule_changes()
 
-    scheduler = AsyncIOScheduler(timezone="Europe/Istanbul")
+    await load_reminders()
 
-    scheduler.add_job(broadcast_reminder, "cron", hour=18, minute=30, args=[bot])
+    scheduler.add_job(metrics.timed_job(check_missing_attendance), "cron",
+                      hour=MISSING_CHECK_TIME // 60, minute=MISSING_CHECK_TIME % 60)
 
-    scheduler.add_job(check_missing_attendance, "cron", hour=23, minute=00, args=[bot])
+    # Picks up users deactivated during the day
+    scheduler.add_job(metrics.timed_job(load_reminders), "cron", hour=0, minute=5)
+
+    scheduler.add_job(metrics.timed_job(refresh_schedule), "interval", minutes=1)
+
+    # Right after midnight yesterday's messages go and the new day's are rendered
+    scheduler.add_job(metrics.timed_job(warm_programs), "cron", hour=0, minute=1)
     
     scheduler.start()
-    await dp.start_polling(bot)
+
+    metrics_server = None
+    if METRICS_PORT:
+        metrics_server = await start_server(metrics, METRICS_HOST, METRICS_PORT)
+    loop_watch = asyncio.create_task(metrics.watch_loop())
+    asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, dump, metrics, METRICS_DUMP)
+
+    try:
+        if BOT_MODE == "webhook":
+            await run_webhook(dp, bot, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET,
+                              concurrency=WEBHOOK_CONCURRENCY, public_url=WEBHOOK_URL)
+        else:
+            await dp.start_polling(bot)
+    finally:
+        scheduler.shutdown(wait=False)
+        loop_watch.cancel()
+        if metrics_server is not None:
+            await metrics_server.cleanup()
+        await outbox.stop()
+        await attendance_writes.stop()
+        await db_pool.close()
 
 
 if __name__ == "__main__":
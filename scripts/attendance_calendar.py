@@ -0,0 +1,192 @@
+import asyncio
+import calendar
+
+from aiogram.types import InlineKeyboardButton
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+import queries
+
+
+MONTHS = ["Ocak", "Şubat", "Mart", "Nisan", "Mayıs", "Haziran",
+          "Temmuz", "Ağustos", "Eylül", "Ekim", "Kasım", "Aralık"]
+WEEKDAYS = ["Pt", "Sa", "Ça", "Pe", "Cu", "Ct", "Pz"]
+
+# Callback data: page to a month, open a day, or a button that does nothing
+MONTH_PREFIX = "calmonth_"
+DAY_PREFIX = "calday_"
+NOOP = "calnoop"
+
+
+class DayIndex:
+    # Every lesson day of the schedule is numbered in date order, and every
+    # lesson gets a bit. lessons_on() is sorted, so the lessons of a day are
+    # one run of bits and "is the day fully marked" is one mask comparison.
+
+    def __init__(self, by_date):
+        self.dates = sorted(by_date)
+        self.day_of = {}
+        self.counts = []
+        self.masks = []
+        self.bit_of = {}
+        self.lesson_day = {}
+
+        bit = 0
+        for day, date_str in enumerate(self.dates):
+            lessons = by_date[date_str]
+            self.day_of[date_str] = day
+            self.counts.append(len(lessons))
+            self.masks.append(((1 << len(lessons)) - 1) << bit)
+            for lesson in lessons:
+                self.bit_of[lesson.lesson_id] = bit
+                self.lesson_day[lesson.lesson_id] = day
+                bit += 1
+
+    def month_range(self):
+        # First and last month with lessons, as "YYYY-MM"
+        if not self.dates:
+            return None, None
+        return self.dates[0][:7], self.dates[-1][:7]
+
+
+class AttendanceDays:
+    # Per user a bit per marked lesson and a bit per fully marked day. A
+    # user is loaded with one query the first time they open the calendar;
+    # after that mark() keeps the bits current on every attendance write, so
+    # paging through months never touches the database. Everything is
+    # dropped when the schedule generation moves, as the bits are renumbered.
+
+    def __init__(self, pool, schedule):
+        self.pool = pool
+        self.schedule = schedule
+        self.generation = None
+        self.index = None
+        self.users = {}
+        self._loads = {}
+        self._marked_while_loading = {}
+
+    def current_index(self):
+        if self.generation != self.schedule.generation:
+            self.index = DayIndex(self.schedule.by_date)
+            self.generation = self.schedule.generation
+            self.users = {}
+        return self.index
+
+    async def days(self, user_id):
+        # (day index, bits of the user's fully marked days)
+        index = self.current_index()
+        state = self.users.get(user_id)
+
+        if state is None:
+            # Concurrent taps of the same user share one load
+            if user_id not in self._loads:
+                self._loads[user_id] = asyncio.create_task(self._load(user_id, index))
+            state = await self._loads[user_id]
+
+        return index, state[1]
+
+    async def _load(self, user_id, index):
+        self._marked_while_loading[user_id] = marked = []
+        try:
+            async with self.pool.read() as db:
+                async with db.execute(queries.USER_MARKED_LESSONS, (user_id,)) as cursor:
+                    lesson_ids = [row[0] for row in await cursor.fetchall()]
+        finally:
+            del self._loads[user_id]
+            del self._marked_while_loading[user_id]
+
+        # Writes committed while the query ran may be missing from its result
+        state = [0, 0]
+        apply_marks(index, state, lesson_ids + marked)
+        if index is self.index:
+            self.users[user_id] = state
+        return state
+
+    def mark(self, user_id, lesson_ids):
+        # Called once the attendance rows are committed
+        if self.generation != self.schedule.generation:
+            return
+
+        state = self.users.get(user_id)
+        if state is not None:
+            apply_marks(self.index, state, lesson_ids)
+        elif user_id in self._marked_while_loading:
+            self._marked_while_loading[user_id].extend(lesson_ids)
+
+
+def apply_marks(index, state, lesson_ids):
+    for lesson_id in lesson_ids:
+        bit = index.bit_of.get(lesson_id)
+        if bit is None:
+            # Removed from the schedule since
+            continue
+
+        state[0] |= 1 << bit
+        day = index.lesson_day[lesson_id]
+        mask = index.masks[day]
+        if state[0] & mask == mask:
+            state[1] |= 1 << day
+
+
+def shift_month(month, offset):
+    year, number = int(month[:4]), int(month[5:7]) - 1 + offset
+    return f"{year + number // 12:04d}-{number % 12 + 1:02d}"
+
+
+def clamp_month(index, month):
+    first, last = index.month_range()
+    return min(max(month, first), last)
+
+
+def render_month(index, completed, month, today):
+    # The message text and keyboard of one month. Lesson days open the day's
+    # attendance sheet; ✅ all marked, ❗ lessons passed but not all marked,
+    # • lessons still ahead. Days without lessons and paging past the
+    # schedule's months are buttons that do nothing.
+    year, number = int(month[:4]), int(month[5:7])
+    first, last = index.month_range()
+    builder = InlineKeyboardBuilder()
+
+    previous_month, next_month = shift_month(month, -1), shift_month(month, 1)
+    builder.row(
+        InlineKeyboardButton(text="◀️" if previous_month >= first else " ",
+                             callback_data=MONTH_PREFIX + previous_month if previous_month >= first else NOOP),
+        InlineKeyboardButton(text=f"{MONTHS[number - 1]} {year}", callback_data=NOOP),
+        InlineKeyboardButton(text="▶️" if next_month <= last else " ",
+                             callback_data=MONTH_PREFIX + next_month if next_month <= last else NOOP),
+    )
+    builder.row(*(InlineKeyboardButton(text=name, callback_data=NOOP) for name in WEEKDAYS))
+
+    lesson_days = done = pending = 0
+    for week in calendar.monthcalendar(year, number):
+        buttons = []
+        for day in week:
+            date_str = f"{month}-{day:02d}"
+            position = index.day_of.get(date_str) if day else None
+
+            if position is None:
+                buttons.append(InlineKeyboardButton(text=str(day) if day else " ", callback_data=NOOP))
+                continue
+
+            lesson_days += 1
+            if completed >> position & 1:
+                text = f"✅{day}"
+                done += 1
+            elif date_str <= today:
+                text = f"❗{day}"
+                pending += 1
+            else:
+                text = f"{day}•"
+            buttons.append(InlineKeyboardButton(text=text, callback_data=DAY_PREFIX + date_str))
+
+        builder.row(*buttons)
+
+    text = (
+        f"📅 *{MONTHS[number - 1]} {year}* yoklama takvimi\n"
+        f"━━━━━━━━━━━━━━\n"
+        f"📚 Ders günü: {lesson_days}\n"
+        f"✅ Tamamlanan: {done}\n"
+        f"❗ Eksik yoklama: {pending}\n"
+        f"━━━━━━━━━━━━━━\n"
+        f"Yoklamasını doldurmak istediğin günü seç."
+    )
+    return text, builder.as_markup()
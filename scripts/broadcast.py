@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+
+
+# Telegram allows roughly 30 messages/s across all chats and about one
+# message/s into the same chat before flood control kicks in
+GLOBAL_RATE = 30
+PER_CHAT_RATE = 1
+
+# What Broadcaster.send did with a message. RETRY means it may succeed later
+# (flood control outlasted the retries, network errors); FAILED will not.
+SENT, BLOCKED, FAILED, RETRY = "sent", "blocked", "failed", "retry"
+
+
+class TokenBucket:
+
+    # Telegram counts over a sliding window, so the default bucket is smooth
+    # (capacity 1) rather than allowing a full second's burst up front
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+    def drain(self, seconds):
+        # After a RetryAfter nobody may send until the penalty has passed.
+        # Every send in flight gets its own RetryAfter for the same flood
+        # limit, so the penalties overlap rather than add up.
+        self._refill()
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+@dataclass
+class BroadcastStats:
+    total: int = 0
+    sent: int = 0
+    failed: int = 0
+    retried: int = 0
+    blocked: list = field(default_factory=list)
+    started: float = field(default_factory=time.monotonic)
+    finished: float = None
+
+    @property
+    def done(self):
+        return self.sent + self.failed + len(self.blocked)
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def rate(self):
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self):
+        return (
+            f"{self.sent}/{self.total} gönderildi, {len(self.blocked)} engelli, "
+            f"{self.failed} hata, {self.retried} tekrar, "
+            f"{self.elapsed:.1f} sn ({self.rate:.1f} mesaj/sn)"
+        )
+
+
+class Broadcaster:
+    # Sends many messages with a bounded number of in-flight requests while
+    # staying under Telegram's global and per-chat limits. Users that blocked
+    # the bot are collected in stats.blocked so the caller can deactivate them.
+
+    def __init__(self, bot, concurrency=20, global_rate=GLOBAL_RATE,
+                 per_chat_rate=PER_CHAT_RATE, max_retries=3, progress_every=500):
+        self.bot = bot
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.progress_every = progress_every
+        self.global_bucket = TokenBucket(global_rate)
+        self.per_chat_interval = 1 / per_chat_rate
+        self._chat_next = {}
+
+    async def _wait_for_chat(self, chat_id):
+        now = time.monotonic()
+        ready_at = self._chat_next.get(chat_id, now)
+        self._chat_next[chat_id] = max(ready_at, now) + self.per_chat_interval
+
+        if ready_at > now:
+            await asyncio.sleep(ready_at - now)
+
+    async def send(self, chat_id, text, stats, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            await self._wait_for_chat(chat_id)
+            await self.global_bucket.acquire()
+
+            try:
+                await self.bot.send_message(chat_id, text, **kwargs)
+                stats.sent += 1
+                return SENT
+            except TelegramRetryAfter as e:
+                stats.retried += 1
+                self.global_bucket.drain(e.retry_after)
+            except TelegramForbiddenError:
+                stats.blocked.append(chat_id)
+                return BLOCKED
+            except TelegramBadRequest as e:
+                if "chat not found" in e.message.lower():
+                    stats.blocked.append(chat_id)
+                    return BLOCKED
+                logging.warning(f"Hata: {chat_id} id'li kullanıcıya ulaşılamadı. {e}")
+                stats.failed += 1
+                return FAILED
+            except Exception as e:
+                logging.warning(f"Hata: {chat_id} id'li kullanıcıya ulaşılamadı. {e}")
+                stats.failed += 1
+                return RETRY
+
+        stats.failed += 1
+        return RETRY
+
+    async def send_all(self, messages, **kwargs):
+        # messages: list of (chat_id, text)
+        stats = BroadcastStats(total=len(messages))
+        pending = iter(messages)
+        progress = {"logged": 0}
+
+        async def worker():
+            for chat_id, text in pending:
+                await self.send(chat_id, text, stats, **kwargs)
+
+                # Other workers may have moved done past a multiple since
+                # this one last looked, so compare steps, not remainders
+                if self.progress_every and stats.done // self.progress_every > progress["logged"]:
+                    progress["logged"] = stats.done // self.progress_every
+                    logging.info(f"Duyuru: {stats.done}/{stats.total} ({stats.rate:.1f} mesaj/sn)")
+
+        workers = min(self.concurrency, len(messages))
+        await asyncio.gather(*(worker() for _ in range(workers)))
+
+        stats.finished = time.monotonic()
+        self.reset_chats()
+        return stats
+
+    def reset_chats(self):
+        # Per-chat pacing only matters within one run of sends
+        self._chat_next.clear()
+
+    async def broadcast(self, chat_ids, text, **kwargs):
+        return await self.send_all([(chat_id, text) for chat_id in chat_ids], **kwargs)
+
+
+if __name__ == "__main__":
+    import argparse
+    from fake_bot import FakeBot
+
+    parser = argparse.ArgumentParser(description="Sahte bot üzerinde duyuru simülasyonu")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--blocked", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--rate", type=int, default=GLOBAL_RATE)
+    parser.add_argument("--server-limit", type=int, default=GLOBAL_RATE, help="Sahte botun saniyelik sınırı")
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    async def simulate():
+        fake = FakeBot(rate_limit=args.server_limit, latency=args.latency,
+                       blocked=range(args.blocked))
+        broadcaster = Broadcaster(fake, concurrency=args.concurrency, global_rate=args.rate)
+        stats = await broadcaster.broadcast(range(args.users), "⏰ Yoklama Saati!")
+        print(stats.summary())
+        print(f"Sahte bot: {len(fake.sent)} mesaj, {fake.flood_hits} flood hatası")
+
+    asyncio.run(simulate())
@@ -0,0 +1,60 @@
+import argparse
+import sqlite3
+import sys
+
+from migrations import DEFAULT_DB, migrate
+
+
+EXPECTED_COUNTERS = """
+    SELECT a.user_id, l.lecture_id, SUM(a.status = 1) AS attended, SUM(a.status = 0) AS missed
+    FROM attendance a
+    JOIN lessons l ON l.lesson_id = a.lesson_id
+    WHERE l.lecture_id IS NOT NULL AND l.removed = 0
+    GROUP BY a.user_id, l.lecture_id
+"""
+
+
+def rebuild_counters(conn):
+    conn.execute("DELETE FROM attendance_counters")
+    conn.execute(f"""
+        INSERT INTO attendance_counters (user_id, lecture_id, attended, missed)
+        {EXPECTED_COUNTERS}
+    """)
+    return conn.execute("SELECT COUNT(*) FROM attendance_counters").fetchone()[0]
+
+
+def verify_counters(conn):
+    # Rows that differ between the stored counters and a fresh recount.
+    # All-zero counters are left behind by deletes and count as absent.
+    stored = """
+        SELECT user_id, lecture_id, attended, missed FROM attendance_counters
+        WHERE attended != 0 OR missed != 0
+    """
+    return conn.execute(f"""
+        SELECT 'eksik', * FROM ({EXPECTED_COUNTERS} EXCEPT {stored})
+        UNION ALL
+        SELECT 'fazla', * FROM ({stored} EXCEPT {EXPECTED_COUNTERS})
+    """).fetchall()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Yoklama sayaçlarını doğrula veya yeniden hesapla")
+    parser.add_argument("db", nargs="?", default=DEFAULT_DB)
+    parser.add_argument("--rebuild", action="store_true")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    migrate(conn)
+
+    if args.rebuild:
+        with conn:
+            rebuilt = rebuild_counters(conn)
+        print(f"{rebuilt} sayaç satırı yeniden hesaplandı.")
+
+    mismatches = verify_counters(conn)
+    for kind, user_id, lecture_id, attended, missed in mismatches:
+        print(f"{kind}: kullanıcı {user_id}, ders {lecture_id}: {attended} katılım, {missed} devamsızlık")
+
+    print("Sayaçlar tutarlı." if not mismatches else f"{len(mismatches)} tutarsız satır.")
+    conn.close()
+    sys.exit(1 if mismatches else 0)
@@ -1,65 +1,229 @@
 import sqlite3
-import pandas as pd
+import argparse
 import os
+from collections import namedtuple
+from migrations import migrate
+from counters import rebuild_counters
+import queries
+from schedule_file import read_schedule
+from schedule_changes import classify_changes, record_changes, summarize_changes
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-def setup_database(csv_file = "data/clean_data.csv",db_name = "lectureflow.db"):
+def sync_lectures(conn, records):
+    # Registers every (committee, lecture, type) seen in records and returns
+    # the lecture_id for each record
+    keys = [(r['committee'], r['lecture_name'], r['type']) for r in records]
 
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
+    conn.executemany(
+        "INSERT OR IGNORE INTO lectures (committee, name, type) VALUES (?, ?, ?)",
+        list(dict.fromkeys(keys))
+    )
 
-    print(f"{db_name} kurulumu başlıyor")
+    lecture_ids = {
+        (committee, name, l_type): lecture_id
+        for lecture_id, committee, name, l_type
+        in conn.execute("SELECT lecture_id, committee, name, type FROM lectures")
+    }
 
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS lessons (
-            lesson_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date TEXT,
-            time TEXT,
-            committee INTEGER,
-            lecture_name TEXT,
-            type TEXT
-        )
-    ''')
+    return [lecture_ids[k] for k in keys]
 
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            user_id INTEGER PRIMARY KEY, -- Telegram ID
-            username TEXT,
-            current_committee INTEGER
-        )
-    ''')
-
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS attendance (
-            attendance_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            lesson_id INTEGER,
-            status INTEGER DEFAULT 0,
-            UNIQUE(user_id, lesson_id),
-            FOREIGN KEY (user_id) REFERENCES users (user_id),
-            FOREIGN KEY (lesson_id) REFERENCES lessons (lesson_id)
+
+# Share of a lecture's hours a student may miss
+ABSENCE_LIMITS = {"Teorik": 0.30, "Pratik": 0.20}
+
+
+def refresh_planned_hours(conn):
+    conn.execute("""
+        UPDATE lectures SET planned_hours = (
+            SELECT COUNT(*) FROM lessons
+            WHERE lessons.lecture_id = lectures.lecture_id AND lessons.removed = 0
         )
-    ''')
+    """)
+
+    # The bot compares each absence against this instead of recomputing it
+    conn.execute("""
+        UPDATE lectures SET max_absent =
+            CAST(planned_hours * (CASE type WHEN 'Teorik' THEN ? ELSE ? END) AS INTEGER)
+    """, (ABSENCE_LIMITS["Teorik"], ABSENCE_LIMITS["Pratik"]))
+
+
+# A session is identified by (term, date, time, lecture name); anything else
+# about it may change between imports without changing its lesson_id
+LESSON_FIELDS = ('committee', 'type', 'sheet', 'lecture_id')
+
+ScheduleDiff = namedtuple("ScheduleDiff", "added updated removed unchanged")
+
+
+def lesson_key(row):
+    return (row['term'], row['date'], row['time'], row['lecture_name'])
+
+
+def diff_schedule(conn, records):
+
+    existing = {}
+    duplicates = []
+    for row in conn.execute("""
+        SELECT lesson_id, term, date, time, lecture_name, committee, type, sheet, lecture_id, removed
+        FROM lessons ORDER BY lesson_id
+    """):
+        row = dict(zip(("lesson_id", "term", "date", "time", "lecture_name", "committee",
+                        "type", "sheet", "lecture_id", "removed"), row))
+        if lesson_key(row) in existing:
+            duplicates.append(row)    # left behind by the old append-only import
+        else:
+            existing[lesson_key(row)] = row
+
+    incoming = {}
+    for record in records:
+        incoming.setdefault(lesson_key(record), record)
+
+    terms = {key[0] for key in incoming}
+    added, updated = [], []
+    unchanged = 0
+    matched = set()
+    adopted = False
+
+    for key, record in incoming.items():
+        row = existing.get(key)
+
+        # Sessions imported before lessons had a term are adopted by the
+        # first import that carries one
+        if row is None and key[0] is not None:
+            legacy = existing.get((None,) + key[1:])
+            if legacy is not None and legacy['lesson_id'] not in matched:
+                row = legacy
+                adopted = True
+
+        if row is None:
+            added.append(record)
+            continue
+
+        matched.add(row['lesson_id'])
+
+        if row['term'] != record['term'] or row['removed'] or any(row[f] != record[f] for f in LESSON_FIELDS):
+            updated.append((row, record))
+        else:
+            unchanged += 1
+
+    # Once an import has adopted sessions without a term, the rest of them in
+    # its date range (copies from the old appends, sessions no longer in the
+    # workbook) belong to it too
+    first = min(record['date'] for record in records) if records else None
+    last = max(record['date'] for record in records) if records else None
 
-    if os.path.exists(csv_file):
-        df = pd.read_csv(csv_file)
+    def imported(row):
+        if row['term'] in terms:
+            return True
+        return row['term'] is None and adopted and first <= row['date'] <= last
 
-        df.columns = ['date', 'time', 'committee', 'lecture_name', 'type']
+    # Only sessions of the terms being imported can disappear
+    removed = [
+        row for row in list(existing.values()) + duplicates
+        if imported(row) and row['lesson_id'] not in matched and not row['removed']
+    ]
 
-        df.to_sql('lessons', conn, if_exists='append', index=False)
-        print(f"{len(df)} ders oturumu 'lessons' tablosuna başarıyla aktarıldı.")
+    return ScheduleDiff(added, updated, removed, unchanged)
+
+
+def apply_schedule_diff(conn, diff):
+
+    conn.executemany("""
+        INSERT INTO lessons (date, time, committee, lecture_name, type, term, sheet, lecture_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (r['date'], r['time'], r['committee'], r['lecture_name'], r['type'], r['term'], r['sheet'], r['lecture_id'])
+        for r in diff.added
+    ])
+
+    conn.executemany("""
+        UPDATE lessons SET term = ?, committee = ?, type = ?, sheet = ?, lecture_id = ?, removed = 0
+        WHERE lesson_id = ?
+    """, [
+        (r['term'], r['committee'], r['type'], r['sheet'], r['lecture_id'], row['lesson_id'])
+        for row, r in diff.updated
+    ])
+
+    # Removed sessions are only flagged, so their attendance survives
+    conn.executemany(
+        "UPDATE lessons SET removed = 1 WHERE lesson_id = ?",
+        [(row['lesson_id'],) for row in diff.removed]
+    )
+
+    # Counters are keyed by lecture, so they follow a session that moved to
+    # another lecture (committee or type correction), and leave out removed
+    # sessions
+    if diff.removed or any(row['lecture_id'] != r['lecture_id'] or row['removed'] for row, r in diff.updated):
+        rebuild_counters(conn)
+
+
+def import_schedule(conn, records):
+
+    with conn:
+        for record, lecture_id in zip(records, sync_lectures(conn, records)):
+            record['lecture_id'] = lecture_id
+
+        diff = diff_schedule(conn, records)
+        known_terms = {row[0] for row in conn.execute("SELECT DISTINCT term FROM lessons")}
+        changes = classify_changes(diff, known_terms, records)
+        apply_schedule_diff(conn, diff)
+
+        if diff.added or diff.updated or diff.removed:
+            refresh_planned_hours(conn)
+            conn.execute(queries.BUMP_SCHEDULE_GENERATION)
+            generation = conn.execute(queries.SCHEDULE_GENERATION).fetchone()[0]
+            record_changes(conn, generation, changes)
+
+    print(
+        f"{len(diff.added)} yeni, {len(diff.updated)} güncellenen, "
+        f"{len(diff.removed)} kaldırılan, {diff.unchanged} değişmeyen ders oturumu."
+    )
+    if changes:
+        print(f"Kaydedilen program değişiklikleri: {summarize_changes(changes)}")
+    return diff
+
+
+def check_duplicate_slots(conn):
+    # The same lecture twice in one slot means two imports both think they
+    # own it; the bot would list it twice and count its hours double
+    duplicates = conn.execute("""
+        SELECT date, time, lecture_name, COUNT(*) FROM lessons
+        WHERE removed = 0
+        GROUP BY date, time, lecture_name
+        HAVING COUNT(*) > 1
+    """).fetchall()
+
+    for date, time, lecture_name, count in duplicates[:10]:
+        print(f"Uyarı: {date} {time} {lecture_name} {count} kez etkin")
+    if len(duplicates) > 10:
+        print(f"Uyarı: ... ve {len(duplicates) - 10} tekrarlanan oturum daha")
+    return duplicates
+
+
+def setup_database(schedule_file = "data/clean_data.parquet",db_name = "lectureflow.db"):
+
+    conn = sqlite3.connect(db_name)
+
+    print(f"{db_name} kurulumu başlıyor")
+
+    migrate(conn)
+
+    if os.path.exists(schedule_file):
+        import_schedule(conn, read_schedule(schedule_file))
+        check_duplicate_slots(conn)
 
     else:
-        print(f"Hata: {csv_file} bulunamadı!")
+        print(f"Hata: {schedule_file} bulunamadı!")
 
-    conn.commit()
     conn.close()
     print("Kurulum başarıyla tamamlandı")
 
 if __name__ == "__main__":
-    setup_database()
 
-    
-    
+    parser = argparse.ArgumentParser(description="Veritabanını kurar ve ders programını içe aktarır")
+    parser.add_argument("schedule", nargs="?", default="data/clean_data.parquet",
+                        help="preprocess çıktısı (.parquet ya da .csv)")
+    parser.add_argument("--db", default="lectureflow.db")
+    args = parser.parse_args()
+
+    setup_database(args.schedule, args.db)
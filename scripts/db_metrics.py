@@ -0,0 +1,107 @@
+import time
+
+
+# The database half of the bot's metrics, kept apart from metrics.py so the
+# pool (and every offline tool using it) does not import aiogram and aiohttp.
+# metrics is a metrics.Metrics; only its statement_name, record_statement and
+# record_fetch are used.
+
+
+class InstrumentedCursor:
+    # Counts the rows read through it and the time spent reading them
+
+    def __init__(self, cursor, metrics, name, elapsed):
+        self._cursor = cursor
+        self._metrics = metrics
+        self._name = name
+        self._elapsed = elapsed
+
+    def __getattr__(self, attr):
+        return getattr(self._cursor, attr)
+
+    async def _fetch(self, fetch, *args):
+        started = time.perf_counter()
+        result = await fetch(*args)
+        elapsed = time.perf_counter() - started
+        self._elapsed += elapsed
+
+        rows = len(result) if isinstance(result, list) else int(result is not None)
+        self._metrics.record_fetch(self._name, elapsed, rows, self._elapsed)
+        return result
+
+    async def fetchone(self):
+        return await self._fetch(self._cursor.fetchone)
+
+    async def fetchmany(self, size=None):
+        return await self._fetch(self._cursor.fetchmany, *(() if size is None else (size,)))
+
+    async def fetchall(self):
+        return await self._fetch(self._cursor.fetchall)
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        while True:
+            rows = await self.fetchmany()
+            if not rows:
+                return
+            for row in rows:
+                yield row
+
+    async def close(self):
+        await self._cursor.close()
+
+
+class InstrumentedStatement:
+    # Like aiosqlite's execute result: awaited for the cursor or used with
+    # `async with` so the cursor is closed afterwards
+
+    def __init__(self, metrics, name, execute):
+        self._metrics = metrics
+        self._name = name
+        self._execute = execute
+        self._cursor = None
+
+    def __await__(self):
+        return self._run().__await__()
+
+    async def _run(self):
+        started = time.perf_counter()
+        cursor = await self._execute()
+        elapsed = time.perf_counter() - started
+        self._metrics.record_statement(self._name, elapsed, max(cursor.rowcount, 0))
+        return InstrumentedCursor(cursor, self._metrics, self._name, elapsed)
+
+    async def __aenter__(self):
+        self._cursor = await self._run()
+        return self._cursor
+
+    async def __aexit__(self, *exc):
+        await self._cursor.close()
+
+
+class InstrumentedConnection:
+    # Wraps an aiosqlite connection; everything but execute/executemany
+    # passes straight through
+
+    def __init__(self, db, metrics):
+        self._db = db
+        self._metrics = metrics
+
+    def __getattr__(self, attr):
+        return getattr(self._db, attr)
+
+    def __setattr__(self, attr, value):
+        if attr.startswith("_"):
+            super().__setattr__(attr, value)
+        else:
+            setattr(self._db, attr, value)
+
+    def execute(self, sql, parameters=None):
+        name = self._metrics.statement_name(sql)
+        return InstrumentedStatement(self._metrics, name, lambda: self._db.execute(sql, parameters))
+
+    def executemany(self, sql, parameters):
+        name = self._metrics.statement_name(sql)
+        return InstrumentedStatement(self._metrics, name, lambda: self._db.executemany(sql, parameters))
@@ -0,0 +1,79 @@
+import asyncio
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+from aiogram.client.session.base import BaseSession
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import EditMessageText, SendMessage
+from aiogram.types import Chat, Message
+
+
+class FakeBot:
+    # In-process stand-in for aiogram's Bot: records every call and raises
+    # the same errors Telegram does when a chat blocked the bot or when more
+    # than rate_limit messages are sent within one second.
+
+    def __init__(self, rate_limit=30, latency=0.0, blocked=(), retry_after=1):
+        self.rate_limit = rate_limit
+        self.latency = latency
+        self.blocked = set(blocked)
+        self.retry_after = retry_after
+        self.sent = []
+        self.flood_hits = 0
+        self._window = deque()
+
+    async def send_message(self, chat_id, text, **kwargs):
+        method = SendMessage(chat_id=chat_id, text=text)
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if chat_id in self.blocked:
+            raise TelegramForbiddenError(method=method, message="Forbidden: bot was blocked by the user")
+
+        now = time.monotonic()
+        while self._window and now - self._window[0] >= 1:
+            self._window.popleft()
+
+        if len(self._window) >= self.rate_limit:
+            self.flood_hits += 1
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=self.retry_after)
+
+        self._window.append(now)
+        self.sent.append((chat_id, text, kwargs))
+        return method
+
+
+class RecordingSession(BaseSession):
+    # Bot API session that never leaves the process: pass it to a real
+    # aiogram Bot (Bot(token, session=RecordingSession())) and every method
+    # the handlers call is counted and answered with a plausible result.
+
+    def __init__(self, latency=0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls = Counter()
+        self._message_id = 0
+
+    async def make_request(self, bot, method, timeout=None):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        self.calls[type(method).__name__] += 1
+
+        if isinstance(method, (SendMessage, EditMessageText)):
+            self._message_id += 1
+            return Message(
+                message_id=self._message_id,
+                date=datetime.now(),
+                chat=Chat(id=method.chat_id or 0, type="private"),
+                text=method.text,
+            )
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
@@ -0,0 +1,344 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import time
+from datetime import date, datetime, timedelta
+
+from migrations import migrate
+from database_setup import import_schedule
+from outbox import percentile
+import queries
+
+
+# --- Synthetic database ---
+
+LECTURE_POOL = [
+    "Anatomi", "Fizyoloji", "Biyokimya", "Histoloji", "Mikrobiyoloji", "Farmakoloji",
+    "Patoloji", "Protetik Diş Tedavisi", "Ortodonti", "Periodontoloji", "Endodonti",
+    "Restoratif Diş Tedavisi", "Ağız, Diş ve Çene Cerrahisi", "Ağız, Diş ve Çene Radyolojisi",
+    "Pedodonti", "Diş Hekimliği Becerileri", "Halk Sağlığı", "Biyoistatistik",
+]
+
+TIMES = ["08:40-09:30", "09:40-10:30", "10:40-11:30", "11:40-12:30",
+         "13:30-14:20", "14:30-15:20", "15:30-16:20", "16:30-17:20"]
+
+
+def last_weekday(day):
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day
+
+
+def synthetic_schedule(today, weeks=32, rng=None):
+    # Two terms of `weeks` weeks in total, ending four weeks after today.
+    # Each five-week committee has its own set of lectures, a third of them
+    # practical, and every weekday has a full set of sessions.
+    rng = rng or random.Random(0)
+    start = today - timedelta(weeks=weeks - 4, days=today.weekday())
+    committee_lectures = {}
+    records = []
+
+    for offset in range(weeks * 7):
+        day = start + timedelta(days=offset)
+        if day.weekday() >= 5:
+            continue
+
+        term = "Güz" if offset < weeks * 7 // 2 else "Bahar"
+        committee = 1 + (offset // 35) % 6
+
+        if committee not in committee_lectures:
+            names = rng.sample(LECTURE_POOL, 8)
+            committee_lectures[committee] = [
+                (f"{name} (P)", "Pratik") if i % 3 == 0 else (name, "Teorik")
+                for i, name in enumerate(names)
+            ]
+
+        for slot in TIMES[:rng.randint(5, len(TIMES))]:
+            lecture_name, lecture_type = rng.choice(committee_lectures[committee])
+            records.append({
+                "date": day.isoformat(), "time": slot, "committee": committee,
+                "lecture_name": lecture_name, "type": lecture_type,
+                "term": term, "sheet": str(committee),
+            })
+
+    return records
+
+
+def build_database(path, users, today, weeks=32, fill=0.85, seed=0):
+    # Users fill in a day with probability `fill`; how often they attend is
+    # drawn per user, so absence counters cover the whole range
+    rng = random.Random(seed)
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    import_schedule(conn, synthetic_schedule(today, weeks, rng))
+
+    user_ids = list(range(100_000, 100_000 + users))
+    with conn:
+        conn.executemany("INSERT INTO users (user_id, username) VALUES (?, ?)",
+                         [(uid, f"ogrenci{uid}") for uid in user_ids])
+
+    lessons_by_date = {}
+    for lesson_id, lesson_date in conn.execute(
+        "SELECT lesson_id, date FROM lessons WHERE date <= ? AND removed = 0", (today.isoformat(),)
+    ):
+        lessons_by_date.setdefault(lesson_date, []).append(lesson_id)
+
+    written = 0
+    for i, user_id in enumerate(user_ids):
+        diligence = rng.uniform(0.6, 1.0)
+        rows = [
+            (user_id, lesson_id, int(rng.random() < diligence))
+            for lesson_ids in lessons_by_date.values() if rng.random() < fill
+            for lesson_id in lesson_ids
+        ]
+        with conn:
+            conn.executemany(queries.SAVE_ATTENDANCE, rows)
+        written += len(rows)
+
+        if (i + 1) % 1000 == 0:
+            print(f"{i + 1}/{users} kullanıcı, {written} yoklama satırı")
+
+    conn.execute("ANALYZE")
+    conn.close()
+    return written
+
+
+# --- Updates ---
+
+def message_update(update_id, user_id, text):
+    message = {
+        "message_id": update_id, "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": "Öğrenci"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
+
+
+def callback_update(update_id, user_id, data):
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id), "chat_instance": str(user_id), "data": data,
+            "from": {"id": user_id, "is_bot": False, "first_name": "Öğrenci"},
+            "message": {
+                "message_id": update_id, "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"}, "text": "...",
+            },
+        },
+    }
+
+
+class Scenario:
+    # Picks users, lectures and lessons for the generated updates
+    def __init__(self, app, rng, user_ids, today):
+        self.rng = rng
+        self.user_ids = user_ids
+        self.lecture_ids = list(app.schedule.max_absent)
+        recent = [(today - timedelta(days=d)).isoformat() for d in range(14)]
+        self.recent_lessons = [l.lesson_id for day in recent for l in app.schedule.lessons_on(day)]
+        self.months = sorted({date_str[:7] for date_str in app.schedule.by_date})
+
+    def user(self):
+        return self.rng.choice(self.user_ids)
+
+    def updates(self, handler, count):
+        rng = self.rng
+        for update_id in range(1, count + 1):
+            user_id = self.user()
+            if handler == "cmd_profil":
+                yield message_update(update_id, user_id, "/profil")
+            elif handler == "process_calculation":
+                yield callback_update(update_id, user_id, f"calc_{rng.choice(self.lecture_ids)}")
+            elif handler == "handle_attendance_button":
+                yield callback_update(update_id, user_id, f"att_{rng.choice(self.recent_lessons)}_{rng.randint(0, 1)}")
+            elif handler == "cmd_program_daily":
+                yield message_update(update_id, user_id, rng.choice(["/program_bugun", "/program_yarin"]))
+            elif handler == "process_calendar_month":
+                yield callback_update(update_id, user_id, f"calmonth_{rng.choice(self.months)}")
+
+
+HANDLERS = ["cmd_profil", "process_calculation", "handle_attendance_button", "cmd_program_daily",
+            "process_calendar_month"]
+
+
+# --- Measurement ---
+
+def summarize(latencies, elapsed, errors=0):
+    if not latencies:
+        return {"count": 0, "errors": errors}
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "max_ms": round(max(latencies) * 1000, 3),
+        "throughput_per_s": round(len(latencies) / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+async def drive(dp, bot, updates, concurrency):
+    # Feeds updates through the real dispatcher, `concurrency` at a time
+    from aiogram.dispatcher.event.bases import UNHANDLED
+    from aiogram.types import Update
+
+    pending = iter(updates)
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        for raw in pending:
+            update = Update.model_validate(raw, context={"bot": bot})
+            started = time.perf_counter()
+            try:
+                result = await dp.feed_update(bot, update)
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            if result is UNHANDLED:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+async def time_job(job, runs):
+    latencies = []
+    started = time.perf_counter()
+    for args in runs:
+        t = time.perf_counter()
+        await job(*args)
+        latencies.append(time.perf_counter() - t)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def pinned_datetime(moment):
+    # The app asks datetime.now() for "today"; the benchmark pins it to a
+    # weekday evening so the program, reminder and attendance paths have work
+    class Pinned(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return cls.combine(moment.date(), moment.time())
+    return Pinned
+
+
+async def run(args, today):
+    os.environ["DATABASE_PATH"] = args.db
+    os.environ.setdefault("API_TOKEN", "123456:LOADTEST")
+
+    from aiogram import Bot
+    from fake_bot import RecordingSession
+    from metrics import ApiTimer
+    import app
+
+    # aiogram logs every handled update at INFO, which would dominate the run
+    logging.getLogger().setLevel(logging.WARNING)
+
+    app.datetime = pinned_datetime(datetime.combine(today, datetime.min.time()).replace(hour=18, minute=30))
+
+    session = RecordingSession(latency=args.api_latency)
+    session.middleware(ApiTimer(app.metrics))
+    bot = Bot(app.API_TOKEN, session=session)
+
+    await app.db_pool.open()
+    async with app.db_pool.read() as db:
+        await app.schedule.load(db)
+        async with db.execute("SELECT user_id FROM users") as cursor:
+            user_ids = [row[0] for row in await cursor.fetchall()]
+    await app.warm_programs()
+    app.attendance_writes.start()
+    await app.load_reminders()
+
+    scenario = Scenario(app, random.Random(args.seed), user_ids, today)
+    results = {}
+
+    try:
+        for handler in args.handlers:
+            results[handler] = await drive(app.dp, bot, scenario.updates(handler, args.requests), args.concurrency)
+            print(f"{handler}: {results[handler]}")
+
+        # The outbox sender is not running, so the jobs are measured up to the
+        # point where their notifications are queued
+        buckets = sorted(app.reminders.buckets)
+        results["send_reminder_bucket"] = await time_job(app.send_reminder_bucket, [(m,) for m in buckets])
+        print(f"send_reminder_bucket: {results['send_reminder_bucket']}")
+
+        results["check_missing_attendance"] = await time_job(app.check_missing_attendance, [()] * args.job_runs)
+        print(f"check_missing_attendance: {results['check_missing_attendance']}")
+    finally:
+        await app.attendance_writes.stop()
+        await app.db_pool.close()
+
+    if args.metrics:
+        with open(args.metrics, "w", encoding="utf-8") as f:
+            f.write(app.metrics.render())
+
+    return results, dict(session.calls)
+
+
+def compare(results, baseline):
+    for name, current in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous or "p95_ms" not in previous or "p95_ms" not in current:
+            continue
+        change = (current["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"] * 100 if previous["p95_ms"] else 0
+        print(f"{name}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms ({change:+.1f}%)")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Bot işleyicileri için yük testi ve gecikme ölçümü")
+    parser.add_argument("--db", default="/tmp/lectureflow_loadtest.db")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--weeks", type=int, default=32, help="İki dönemin toplam hafta sayısı")
+    parser.add_argument("--fill", type=float, default=0.85, help="Bir kullanıcının bir günü doldurma olasılığı")
+    parser.add_argument("--reuse", action="store_true", help="Var olan veritabanını yeniden kurma")
+    parser.add_argument("--requests", type=int, default=2000, help="İşleyici başına güncelleme sayısı")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--handlers", nargs="+", choices=HANDLERS, default=HANDLERS)
+    parser.add_argument("--job-runs", type=int, default=5)
+    parser.add_argument("--api-latency", type=float, default=0.0, help="Sahte Bot API gecikmesi (sn)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="loadtest.json")
+    parser.add_argument("--compare", help="Karşılaştırılacak önceki sonuç dosyası")
+    parser.add_argument("--metrics", help="Çalışma sonundaki Prometheus metriklerinin yazılacağı dosya")
+    args = parser.parse_args()
+
+    today = last_weekday(date.today())
+
+    if not (args.reuse and os.path.exists(args.db)):
+        started = time.perf_counter()
+        rows = build_database(args.db, args.users, today, args.weeks, args.fill, args.seed)
+        print(f"Sentetik veritabanı hazır: {args.users} kullanıcı, {rows} yoklama ({time.perf_counter() - started:.1f} sn)")
+
+    results, api_calls = asyncio.run(run(args, today))
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "today": today.isoformat(),
+        "config": vars(args),
+        "api_calls": api_calls,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Sonuçlar {args.output} dosyasına yazıldı.")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(results, json.load(f))
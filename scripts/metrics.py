@@ -0,0 +1,251 @@
+import asyncio
+import functools
+import logging
+import time
+from bisect import bisect_left
+
+from aiohttp import web
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+import queries
+
+
+# Seconds; wide enough for a 1 ms query and a 10 s broadcast batch
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names, values, extra=""):
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{format_labels(self.labels, labels)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+
+    def set(self, *labels, value):
+        self.values[labels] = value
+
+    def render(self):
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    # Per label set: a count per bucket (not cumulative until rendered), sum and count
+
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, *labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket
+                bucket_labels = format_labels(self.labels, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, labels)} {total:.6f}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, labels)} {count}")
+        return lines
+
+
+class Metrics:
+    # Everything the bot measures, kept in memory and rendered as Prometheus
+    # text. All updates happen on the event loop, so no locking is needed.
+
+    def __init__(self, slow_query=0.1):
+        self.slow_query = slow_query
+
+        self.updates = Histogram("lectureflow_update_seconds", "Güncelleme işleme süresi", ("handler",))
+        self.update_errors = Counter("lectureflow_update_errors_total", "Hata veren güncellemeler", ("handler",))
+        self.updates_in_flight = Gauge("lectureflow_updates_in_flight", "İşlenmekte olan güncellemeler")
+        self.statements = Histogram("lectureflow_db_statement_seconds", "SQL çalıştırma süresi", ("statement",))
+        self.fetches = Histogram("lectureflow_db_fetch_seconds", "SQL sonuç okuma süresi", ("statement",))
+        self.rows = Counter("lectureflow_db_rows_total", "Okunan ya da değişen satırlar", ("statement",))
+        self.slow_queries = Counter("lectureflow_db_slow_queries_total", "Eşiği aşan SQL çağrıları", ("statement",))
+        self.jobs = Histogram("lectureflow_job_seconds", "Zamanlanmış görev süresi", ("job",))
+        self.job_errors = Counter("lectureflow_job_errors_total", "Hata veren zamanlanmış görevler", ("job",))
+        self.api_calls = Histogram("lectureflow_telegram_api_seconds", "Telegram API çağrı süresi", ("method",))
+        self.api_errors = Counter("lectureflow_telegram_api_errors_total", "Hata veren Telegram API çağrıları", ("method", "error"))
+        self.loop_lag = Histogram("lectureflow_event_loop_lag_seconds", "Olay döngüsü gecikmesi")
+
+        self.statement_names = {sql: name for name, sql in queries.bot_queries().items()}
+
+    def statement_name(self, sql):
+        # Queries from queries.py by their name, anything else by its first words
+        name = self.statement_names.get(sql)
+        if name is None:
+            name = " ".join(sql.split()[:3])
+        return name
+
+    def record_statement(self, name, elapsed, rows):
+        self.statements.observe(name, value=elapsed)
+        if rows > 0:
+            self.rows.inc(name, amount=rows)
+        self.check_slow(name, elapsed, rows)
+
+    def record_fetch(self, name, elapsed, rows, total):
+        # total: execute + fetch time so far, what the slow-query log judges
+        self.fetches.observe(name, value=elapsed)
+        self.rows.inc(name, amount=rows)
+        if total - elapsed < self.slow_query:
+            self.check_slow(name, total, rows)
+
+    def check_slow(self, name, elapsed, rows):
+        if self.slow_query and elapsed >= self.slow_query:
+            self.slow_queries.inc(name)
+            logging.warning(f"Yavaş sorgu: {name} {elapsed * 1000:.1f} ms, {rows} satır")
+
+    def timed_job(self, func):
+        # Wraps a coroutine function given to the scheduler
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                self.job_errors.inc(func.__name__)
+                raise
+            finally:
+                self.jobs.observe(func.__name__, value=time.perf_counter() - started)
+        return wrapper
+
+    async def watch_loop(self, interval=0.5):
+        # A sleep that wakes up late means something blocked the event loop
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            self.loop_lag.observe(value=max(time.perf_counter() - started - interval, 0.0))
+
+    def render(self):
+        lines = []
+        for metric in (
+            self.updates, self.update_errors, self.updates_in_flight,
+            self.statements, self.fetches, self.rows, self.slow_queries,
+            self.jobs, self.job_errors, self.api_calls, self.api_errors, self.loop_lag,
+        ):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class UpdateTimer(BaseMiddleware):
+    # Outer middleware on dp.update: times each update from dispatch to the
+    # handler's return. The handler's name is only known once the router has
+    # picked it, so HandlerName (an inner middleware on the message and
+    # callback_query observers) writes it into a slot this one reads back.
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.in_flight = 0
+
+    async def __call__(self, handler, event, data):
+        slot = data["metrics_handler"] = {"name": "unhandled"}
+        self.in_flight += 1
+        self.metrics.updates_in_flight.set(value=self.in_flight)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.metrics.update_errors.inc(slot["name"])
+            raise
+        finally:
+            self.in_flight -= 1
+            self.metrics.updates_in_flight.set(value=self.in_flight)
+            self.metrics.updates.observe(slot["name"], value=time.perf_counter() - started)
+
+
+class HandlerName(BaseMiddleware):
+
+    async def __call__(self, handler, event, data):
+        slot = data.get("metrics_handler")
+        if slot is not None:
+            slot["name"] = data["handler"].callback.__name__
+        return await handler(event, data)
+
+
+class ApiTimer(BaseRequestMiddleware):
+    # Session middleware: times every Telegram API call by method name
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            self.metrics.api_errors.inc(name, type(e).__name__)
+            raise
+        finally:
+            self.metrics.api_calls.observe(name, value=time.perf_counter() - started)
+
+
+def instrument(metrics, dp, bot):
+    dp.update.outer_middleware(UpdateTimer(metrics))
+    dp.message.middleware(HandlerName())
+    dp.callback_query.middleware(HandlerName())
+    bot.session.middleware(ApiTimer(metrics))
+
+
+async def start_server(metrics, host, port):
+    # Serves GET /metrics; returns the runner to clean up on shutdown
+    async def handle(request):
+        return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logging.info(f"Metrikler yayında: http://{host}:{port}/metrics")
+    return runner
+
+
+def dump(metrics, path=None):
+    # SIGUSR1: the current metrics to a file, or to the log without one
+    text = metrics.render()
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        logging.info(f"Metrikler yazıldı: {path}")
+    else:
+        logging.info("Metrikler:\n" + text)
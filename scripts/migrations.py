@@ -0,0 +1,362 @@
+import argparse
+import os
+import sqlite3
+import sys
+
+import queries
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB = os.path.join(BASE_DIR, "database", "lectureflow.db")
+
+
+# Each entry is one schema version; the list index + 1 is the version number
+# stored in PRAGMA user_version. Never edit a released entry, append a new one.
+MIGRATIONS = [
+    # 1: base schema (what setup_database used to create inline)
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS lessons (
+            lesson_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT,
+            time TEXT,
+            committee INTEGER,
+            lecture_name TEXT,
+            type TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY, -- Telegram ID
+            username TEXT,
+            current_committee INTEGER
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS attendance (
+            attendance_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            lesson_id INTEGER,
+            status INTEGER DEFAULT 0,
+            UNIQUE(user_id, lesson_id),
+            FOREIGN KEY (user_id) REFERENCES users (user_id),
+            FOREIGN KEY (lesson_id) REFERENCES lessons (lesson_id)
+        )
+        ''',
+    ],
+    # 2: indexes for the hot bot queries
+    [
+        "CREATE INDEX IF NOT EXISTS idx_lessons_date_time ON lessons (date, time, lecture_name)",
+        "CREATE INDEX IF NOT EXISTS idx_lessons_committee_lecture ON lessons (committee, lecture_name, type)",
+        "CREATE INDEX IF NOT EXISTS idx_attendance_user_status ON attendance (user_id, status, lesson_id)",
+    ],
+    # 3: key/value metadata; schedule_generation is bumped on every import
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER
+        )
+        ''',
+        "INSERT OR IGNORE INTO meta (key, value) VALUES ('schedule_generation', 0)",
+    ],
+    # 4: users who blocked the bot are skipped by broadcasts until they /start again
+    [
+        "ALTER TABLE users ADD COLUMN is_active INTEGER NOT NULL DEFAULT 1",
+    ],
+    # 5: attendance by lesson, for the per-day missing attendance aggregate
+    [
+        "CREATE INDEX IF NOT EXISTS idx_attendance_lesson_user ON attendance (lesson_id, user_id)",
+    ],
+    # 6: lecture dimension; lessons point at it and callbacks carry lecture_id
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS lectures (
+            lecture_id INTEGER PRIMARY KEY,
+            committee INTEGER,
+            name TEXT NOT NULL,
+            type TEXT NOT NULL,
+            planned_hours INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        # committee is NULL for the general lectures, which UNIQUE would treat as distinct
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_lectures_key ON lectures (IFNULL(committee, -1), name, type)",
+        "CREATE INDEX IF NOT EXISTS idx_lectures_committee ON lectures (committee, name)",
+        "ALTER TABLE lessons ADD COLUMN lecture_id INTEGER REFERENCES lectures (lecture_id)",
+        '''
+        INSERT OR IGNORE INTO lectures (committee, name, type)
+        SELECT DISTINCT committee, lecture_name, type FROM lessons
+        ''',
+        '''
+        UPDATE lessons SET lecture_id = (
+            SELECT lecture_id FROM lectures
+            WHERE IFNULL(lectures.committee, -1) = IFNULL(lessons.committee, -1)
+              AND lectures.name = lessons.lecture_name
+              AND lectures.type = lessons.type
+        )
+        ''',
+        '''
+        UPDATE lectures SET planned_hours = (
+            SELECT COUNT(*) FROM lessons WHERE lessons.lecture_id = lectures.lecture_id
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_lessons_lecture ON lessons (lecture_id, date)",
+        "DROP INDEX IF EXISTS idx_lessons_committee_lecture",
+    ],
+    # 7: per-(user, lecture) attendance counters kept current by triggers.
+    # Connections need recursive_triggers on, so INSERT OR REPLACE fires the
+    # delete trigger for the row it replaces.
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS attendance_counters (
+            user_id INTEGER NOT NULL,
+            lecture_id INTEGER NOT NULL,
+            attended INTEGER NOT NULL DEFAULT 0,
+            missed INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, lecture_id)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_attendance_counters_insert AFTER INSERT ON attendance
+        BEGIN
+            INSERT INTO attendance_counters (user_id, lecture_id, attended, missed)
+            SELECT NEW.user_id, lecture_id, NEW.status = 1, NEW.status = 0
+            FROM lessons WHERE lesson_id = NEW.lesson_id AND lecture_id IS NOT NULL
+            ON CONFLICT (user_id, lecture_id) DO UPDATE SET
+                attended = attended + excluded.attended,
+                missed = missed + excluded.missed;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_attendance_counters_update AFTER UPDATE OF status ON attendance
+        WHEN OLD.status IS NOT NEW.status
+        BEGIN
+            UPDATE attendance_counters SET
+                attended = attended + (NEW.status = 1) - (OLD.status = 1),
+                missed = missed + (NEW.status = 0) - (OLD.status = 0)
+            WHERE user_id = NEW.user_id
+              AND lecture_id = (SELECT lecture_id FROM lessons WHERE lesson_id = NEW.lesson_id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_attendance_counters_delete AFTER DELETE ON attendance
+        BEGIN
+            UPDATE attendance_counters SET
+                attended = attended - (OLD.status = 1),
+                missed = missed - (OLD.status = 0)
+            WHERE user_id = OLD.user_id
+              AND lecture_id = (SELECT lecture_id FROM lessons WHERE lesson_id = OLD.lesson_id);
+        END
+        ''',
+        '''
+        INSERT OR REPLACE INTO attendance_counters (user_id, lecture_id, attended, missed)
+        SELECT a.user_id, l.lecture_id, SUM(a.status = 1), SUM(a.status = 0)
+        FROM attendance a
+        JOIN lessons l ON l.lesson_id = a.lesson_id
+        WHERE l.lecture_id IS NOT NULL
+        GROUP BY a.user_id, l.lecture_id
+        ''',
+    ],
+    # 8: which term and workbook sheet each lesson was imported from
+    [
+        "ALTER TABLE lessons ADD COLUMN term TEXT",
+        "ALTER TABLE lessons ADD COLUMN sheet TEXT",
+    ],
+    # 9: re-imports update lessons in place and flag dropped sessions
+    [
+        "ALTER TABLE lessons ADD COLUMN removed INTEGER NOT NULL DEFAULT 0",
+        "CREATE INDEX IF NOT EXISTS idx_lessons_natural_key ON lessons (term, date, time, lecture_name)",
+    ],
+    # 10: scheduled notifications are written to an outbox before sending
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS outbox (
+            outbox_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            date TEXT NOT NULL,
+            text TEXT NOT NULL,
+            parse_mode TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',   -- pending, sent, blocked, failed
+            attempts INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            next_attempt_at REAL NOT NULL,
+            sent_at REAL,
+            UNIQUE (user_id, kind, date)
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (next_attempt_at) WHERE status = 'pending'",
+    ],
+    # 11: per-user reminder time (minute of day, NULL = default) and opt-out
+    [
+        "ALTER TABLE users ADD COLUMN reminder_minute INTEGER",
+        "ALTER TABLE users ADD COLUMN reminders INTEGER NOT NULL DEFAULT 1",
+    ],
+    # 12: absence allowance per lecture, computed at import, and the alerts
+    # already sent for it
+    [
+        "ALTER TABLE lectures ADD COLUMN max_absent INTEGER NOT NULL DEFAULT 0",
+        """
+        UPDATE lectures SET max_absent =
+            CAST(planned_hours * (CASE type WHEN 'Teorik' THEN 0.30 ELSE 0.20 END) AS INTEGER)
+        """,
+        '''
+        CREATE TABLE IF NOT EXISTS absence_alerts (
+            user_id INTEGER NOT NULL,
+            lecture_id INTEGER NOT NULL,
+            threshold INTEGER NOT NULL,
+            fired_at TEXT NOT NULL,
+            PRIMARY KEY (user_id, lecture_id, threshold)
+        ) WITHOUT ROWID
+        ''',
+    ],
+    # 13: what each import changed for students (added, moved, cancelled,
+    # renamed sessions), kept until the bot has notified the affected users
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS schedule_changes (
+            change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            generation INTEGER NOT NULL,
+            kind TEXT NOT NULL,                       -- added, moved, cancelled, renamed
+            old_lecture_id INTEGER,
+            old_name TEXT,
+            old_date TEXT,
+            old_time TEXT,
+            new_lecture_id INTEGER,
+            new_name TEXT,
+            new_date TEXT,
+            new_time TEXT,
+            notified INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_schedule_changes_pending ON schedule_changes (change_id) WHERE notified = 0",
+        "CREATE INDEX IF NOT EXISTS idx_attendance_counters_lecture ON attendance_counters (lecture_id, user_id)",
+    ],
+    # 14: attendance on sessions flagged removed no longer counts, the same
+    # as planned_hours and max_absent
+    [
+        "DROP TRIGGER IF EXISTS trg_attendance_counters_insert",
+        "DROP TRIGGER IF EXISTS trg_attendance_counters_update",
+        "DROP TRIGGER IF EXISTS trg_attendance_counters_delete",
+        '''
+        CREATE TRIGGER trg_attendance_counters_insert AFTER INSERT ON attendance
+        BEGIN
+            INSERT INTO attendance_counters (user_id, lecture_id, attended, missed)
+            SELECT NEW.user_id, lecture_id, NEW.status = 1, NEW.status = 0
+            FROM lessons WHERE lesson_id = NEW.lesson_id AND lecture_id IS NOT NULL AND removed = 0
+            ON CONFLICT (user_id, lecture_id) DO UPDATE SET
+                attended = attended + excluded.attended,
+                missed = missed + excluded.missed;
+        END
+        ''',
+        '''
+        CREATE TRIGGER trg_attendance_counters_update AFTER UPDATE OF status ON attendance
+        WHEN OLD.status IS NOT NEW.status
+        BEGIN
+            UPDATE attendance_counters SET
+                attended = attended + (NEW.status = 1) - (OLD.status = 1),
+                missed = missed + (NEW.status = 0) - (OLD.status = 0)
+            WHERE user_id = NEW.user_id
+              AND lecture_id = (SELECT lecture_id FROM lessons WHERE lesson_id = NEW.lesson_id AND removed = 0);
+        END
+        ''',
+        '''
+        CREATE TRIGGER trg_attendance_counters_delete AFTER DELETE ON attendance
+        BEGIN
+            UPDATE attendance_counters SET
+                attended = attended - (OLD.status = 1),
+                missed = missed - (OLD.status = 0)
+            WHERE user_id = OLD.user_id
+              AND lecture_id = (SELECT lecture_id FROM lessons WHERE lesson_id = OLD.lesson_id AND removed = 0);
+        END
+        ''',
+        "DELETE FROM attendance_counters",
+        '''
+        INSERT INTO attendance_counters (user_id, lecture_id, attended, missed)
+        SELECT a.user_id, l.lecture_id, SUM(a.status = 1), SUM(a.status = 0)
+        FROM attendance a
+        JOIN lessons l ON l.lesson_id = a.lesson_id
+        WHERE l.lecture_id IS NOT NULL AND l.removed = 0
+        GROUP BY a.user_id, l.lecture_id
+        ''',
+    ],
+    # 15: the day after which an unsent outbox row is dropped (status
+    # 'expired'); NULL rows, such as schedule change notices, never expire
+    [
+        "ALTER TABLE outbox ADD COLUMN expires TEXT",
+        "UPDATE outbox SET expires = date WHERE kind IN ('reminder', 'missing')",
+    ],
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    current = get_version(conn)
+
+    if current > SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Veritabanı şeması ({current}) bu sürümden ({SCHEMA_VERSION}) daha yeni."
+        )
+
+    # Explicit transactions, so each version is applied all-or-nothing
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+
+    try:
+        for version in range(current + 1, SCHEMA_VERSION + 1):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for statement in MIGRATIONS[version - 1]:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {version}")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            print(f"Şema sürümü {version} uygulandı.")
+    finally:
+        conn.isolation_level = isolation_level
+
+    return SCHEMA_VERSION - current
+
+
+def check_query_plans(conn):
+    # Returns (query name, plan detail) for every bot query that falls back
+    # to a full table scan
+    problems = []
+
+    for name, sql in queries.bot_queries().items():
+        if name in queries.FULL_SCAN_OK:
+            continue
+
+        params = (None,) * sql.count("?")
+        for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params):
+            detail = row[3]
+            if detail.startswith("SCAN") and "CONSTANT ROW" not in detail:
+                problems.append((name, detail))
+
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LectureFlow şema göçleri")
+    parser.add_argument("db", nargs="?", default=DEFAULT_DB)
+    parser.add_argument("--check", action="store_true", help="Sorgu planlarında tablo taraması ara")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    applied = migrate(conn)
+    print(f"{args.db}: sürüm {get_version(conn)} ({applied} göç uygulandı)")
+
+    if args.check:
+        problems = check_query_plans(conn)
+        for name, detail in problems:
+            print(f"TARAMA: {name}: {detail}")
+        conn.close()
+        sys.exit(1 if problems else 0)
+
+    conn.close()
@@ -0,0 +1,234 @@
+import argparse
+import glob
+import json
+import os
+import re
+import time
+from collections import Counter
+from functools import lru_cache
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(os.path.dirname(BASE_DIR), "data")
+GOLDEN_PATH = os.path.join(DATA_DIR, "normalize_golden.json")
+
+# --- Rule table ---
+
+COMMITTEE_KEYWORDS = ("KOMİTE", "COMMITTEE")
+
+# A panel is always part of committee 5, and its title follows the last "/"
+PANEL_MARKER = "PANEL:"
+PANEL_COMMITTEE = 5
+
+# Cell texts containing any of these (upper-cased) are practical sessions
+PRATIK_MARKERS = ("(P)", "LAB", "PRATİK", "FANTOM")
+
+# Lowercase or unclosed (P / (T suffixes are written out in full
+SUFFIX_RULES = (
+    (r'\((P|p)$', '(P)'),
+    (r'\((T|t)$', '(T)'),
+)
+
+_keywords = "|".join(COMMITTEE_KEYWORDS)
+
+FIRST_SEGMENT = re.compile(r'\s{2,}')
+COMMITTEE = re.compile(rf'({_keywords})\s*[-]*\s*(\d+)', re.IGNORECASE)
+COMMITTEE_PREFIX = re.compile(rf'({_keywords})\s*[-]*\s*\d+\s*/\s*', re.IGNORECASE)
+SUFFIXES = tuple((re.compile(pattern), replacement) for pattern, replacement in SUFFIX_RULES)
+PRATIK = re.compile("|".join(re.escape(marker) for marker in PRATIK_MARKERS))
+PRATIK_SUFFIX = re.compile(r'\([Pp]\)?$')
+
+
+# --- Engine ---
+
+@lru_cache(maxsize=4096)
+def normalize_cell(text):
+    # (committee, lecture name, "Pratik"/"Teorik") for one schedule cell.
+    # The same few hundred cell texts repeat thousands of times, hence the cache.
+
+    lecture_type = "Pratik" if PRATIK.search(text.upper()) else "Teorik"
+
+    if text.lower() == 'nan':
+        return None, _type_suffix("Belirsiz", lecture_type), lecture_type
+
+    clean_text = FIRST_SEGMENT.split(text.split("\n")[0].strip())[0].strip()
+
+    committee_match = COMMITTEE.search(clean_text)
+    committee = int(committee_match.group(2)) if committee_match else None
+
+    if PANEL_MARKER in clean_text.upper():
+        committee = PANEL_COMMITTEE
+        lecture = clean_text.split('/')[-1].strip()
+    elif committee is not None:
+        lecture = COMMITTEE_PREFIX.sub('', clean_text).strip()
+    else:
+        lecture = clean_text
+
+    for pattern, replacement in SUFFIXES:
+        lecture = pattern.sub(replacement, lecture)
+
+    return committee, _type_suffix(lecture, lecture_type), lecture_type
+
+def _type_suffix(lecture, lecture_type):
+
+    lecture = lecture.strip()
+
+    if lecture_type == "Pratik":
+        if PRATIK_SUFFIX.search(lecture):
+            lecture = PRATIK_SUFFIX.sub('(P)', lecture)
+        else:
+            lecture = f"{lecture} (P)"
+
+    return lecture
+
+
+# --- Reference implementation ---
+# The original per-cell normalization, kept to regenerate the golden corpus
+# and as the "before" side of the benchmark
+
+def reference_normalize_name(text):
+
+    if not isinstance(text, str) or text.lower() == 'nan':
+        return None, "Belirsiz"
+
+    first_row = text.split("\n")[0].strip()
+    clean_text = re.split(r'\s{2,}',first_row)[0].strip()
+
+    committee_match = re.search(r'(KOMİTE|COMMITTEE)\s*[-]*\s*(\d+)', clean_text, re.IGNORECASE)
+    committee_num = int(committee_match.group(2)) if committee_match else None
+
+    if "PANEL:" in clean_text.upper():
+        committee_num = 5
+        if "/" in clean_text:
+            lecture_name = clean_text.split('/')[-1].strip()
+        else:
+            lecture_name = clean_text
+
+    elif committee_num is not None:
+        lecture_name = re.sub(r'(KOMİTE|COMMITTEE)\s*[-]*\s*\d+\s*/\s*', '', clean_text, flags=re.IGNORECASE).strip()
+
+    else:
+        lecture_name = clean_text
+
+    lecture_name = re.sub(r'\((P|p)$', '(P)', lecture_name)
+    lecture_name = re.sub(r'\((T|t)$', '(T)', lecture_name)
+
+    return committee_num,lecture_name
+
+def reference_normalize_lecture_name(lecture_name,lecture_type):
+
+    lecture_name = lecture_name.strip()
+
+    if lecture_type == "Pratik":
+        if not re.search(r'\([Pp]\)?$', lecture_name):
+            lecture_name = f"{lecture_name} (P)"
+
+        else:
+            lecture_name = re.sub(r'\([Pp]\)?$', '(P)', lecture_name)
+
+    return lecture_name
+
+def reference_normalize_cell(text):
+
+    committee, lecture = reference_normalize_name(text)
+
+    lecture_type = "Pratik" if re.search(r'\(P\)|LAB|PRATİK|FANTOM', text.upper()) else "Teorik"
+
+    lecture = reference_normalize_lecture_name(lecture,lecture_type)
+
+    return committee, lecture, lecture_type
+
+
+# --- Golden corpus ---
+
+def extract_cell_texts(workbooks):
+    # Every non-empty lecture cell of every schedule row, with how often it occurs
+    from openpyxl import load_workbook
+    from preprocess import MAX_LECTURE_COLUMN, clock_pattern, is_excluded, iter_sheet_rows, read_merged_ranges
+
+    counts = Counter()
+
+    for path in workbooks:
+        workbook = load_workbook(path, read_only=True, data_only=True)
+
+        for sheet_name in workbook.sheetnames:
+            if is_excluded(sheet_name):
+                continue
+
+            for cells in iter_sheet_rows(workbook[sheet_name], read_merged_ranges(path, sheet_name)):
+                if cells and re.search(clock_pattern, cells[0]):
+                    counts.update(text for text in cells[1:MAX_LECTURE_COLUMN + 1] if text)
+
+        workbook.close()
+
+    return counts
+
+def write_golden(counts, path=GOLDEN_PATH):
+
+    corpus = [
+        {"text": text, "count": count, "expected": list(reference_normalize_cell(text))}
+        for text, count in sorted(counts.items())
+    ]
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(corpus, f, ensure_ascii=False, indent=1)
+
+    return corpus
+
+def load_golden(path=GOLDEN_PATH):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def check_golden(corpus):
+    return [
+        (entry["text"], entry["expected"], list(normalize_cell(entry["text"])))
+        for entry in corpus
+        if list(normalize_cell(entry["text"])) != entry["expected"]
+    ]
+
+
+# --- Benchmark ---
+
+def benchmark(corpus, repeat=5):
+    # Replays the corpus with its real repetition counts and reports cells/sec
+    cells = [entry["text"] for entry in corpus for _ in range(entry["count"])] * repeat
+    results = {}
+
+    for name, function in (("önce (referans)", reference_normalize_cell),
+                           ("sonra (önbelleksiz)", normalize_cell.__wrapped__),
+                           ("sonra (LRU)", normalize_cell)):
+        normalize_cell.cache_clear()
+        started = time.perf_counter()
+        for text in cells:
+            function(text)
+        elapsed = time.perf_counter() - started
+        results[name] = len(cells) / elapsed
+
+    return len(cells), results
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Ders adı normalizasyonu: altın derlem ve ölçüm")
+    parser.add_argument("--update", action="store_true", help="Derlemi data/ altındaki kitaplardan yeniden üret")
+    parser.add_argument("--bench", action="store_true")
+    args = parser.parse_args()
+
+    if args.update:
+        workbooks = sorted(glob.glob(os.path.join(DATA_DIR, "*.xlsx")))
+        corpus = write_golden(extract_cell_texts(workbooks))
+        print(f"{len(corpus)} farklı hücre metni {GOLDEN_PATH} dosyasına yazıldı.")
+    else:
+        corpus = load_golden()
+
+    mismatches = check_golden(corpus)
+    for text, expected, actual in mismatches:
+        print(f"FARK: {text!r}: beklenen {expected}, bulunan {actual}")
+    print(f"{len(corpus) - len(mismatches)}/{len(corpus)} hücre altın derlemle uyumlu.")
+
+    if args.bench:
+        total, results = benchmark(corpus)
+        for name, rate in results.items():
+            print(f"{name}: {rate:,.0f} hücre/sn ({total} hücre)")
+
+    raise SystemExit(1 if mismatches else 0)
@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import sqlite3
+import sys
+import time
+
+import queries
+from broadcast import SENT, BLOCKED, FAILED, RETRY, Broadcaster, BroadcastStats
+from migrations import DEFAULT_DB
+from reminders import spread_offset
+
+
+class OutboxSender:
+    # Scheduled notifications are first written to the outbox table, one row
+    # per (user, kind, date), and only then sent. The sender drains due rows
+    # in batches, so a restart halfway through the 18:30 reminder resumes
+    # where it stopped and re-running a job cannot send anything twice.
+    # Outcomes are written in small groups (every finish_interval seconds or
+    # `concurrency` rows), so a crash may repeat the messages in flight and
+    # the last unwritten group, never skip one, without an fsync per message.
+    # Rows still pending after their expires day are dropped, not sent.
+
+    def __init__(self, pool, bot, batch_size=200, max_attempts=5, retry_delay=60,
+                 poll_interval=60, concurrency=20, finish_interval=0.1):
+        self.pool = pool
+        self.broadcaster = Broadcaster(bot, concurrency=concurrency, progress_every=0)
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self.concurrency = concurrency
+        self.finish_interval = finish_interval
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._task = None
+
+    def start(self):
+        # Anything left pending by the previous run goes out first
+        self._task = asyncio.create_task(self._run())
+
+    def wake(self):
+        self._wakeup.set()
+
+    async def enqueue(self, kind, date_str, messages, parse_mode=None, spread=0, expires=None):
+        # messages: list of (user_id, text). With spread (seconds) each row is
+        # held back by a fixed per-user offset within that window, so a large
+        # notification trickles out instead of arriving at once. created_at is
+        # the time a row becomes due, so delivery latency leaves the hold out.
+        # expires: the last day ("YYYY-MM-DD") the rows may still go out, or
+        # None to keep retrying. Returns how many rows were new.
+        now = time.time()
+        rows = []
+        for user_id, text in messages:
+            due = now + spread_offset(user_id, spread)
+            rows.append((user_id, kind, date_str, text, parse_mode, due, due, expires))
+
+        async with self.pool.write() as db:
+            before = db.total_changes
+            await db.executemany(queries.ENQUEUE_NOTIFICATION, rows)
+            added = db.total_changes - before
+
+        logging.info(f"Giden kutusu: {kind} {date_str} için {added} yeni bildirim ({len(messages) - added} zaten vardı)")
+        self.wake()
+        return added
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await self.drain()
+            except Exception:
+                logging.exception("Giden kutusu boşaltılamadı")
+
+            timeout = await self._next_wait()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _next_wait(self):
+        # Sleeps until the earliest retry, but never longer than poll_interval
+        async with self.pool.read() as db:
+            async with db.execute(queries.NEXT_NOTIFICATION_AT) as cursor:
+                next_at = (await cursor.fetchone())[0]
+
+        if next_at is None:
+            return self.poll_interval
+        return min(max(next_at - time.time(), 0.1), self.poll_interval)
+
+    async def drain(self):
+        async with self.pool.write() as db:
+            async with db.execute(queries.EXPIRE_NOTIFICATIONS, (time.strftime("%Y-%m-%d"),)) as cursor:
+                expired = await cursor.fetchall()
+
+        groups = {}
+        for user_id, kind, date_str in expired:
+            groups.setdefault((kind, date_str), []).append(user_id)
+        for (kind, date_str), user_ids in sorted(groups.items()):
+            shown = ", ".join(str(user_id) for user_id in user_ids[:10])
+            more = f" ve {len(user_ids) - 10} kişi daha" if len(user_ids) > 10 else ""
+            logging.warning(f"Giden kutusu: {kind} {date_str} için {len(user_ids)} bildirim süresi geçtiği için "
+                            f"gönderilmedi (kullanıcılar: {shown}{more})")
+
+        while not self._closing:
+            async with self.pool.read() as db:
+                async with db.execute(queries.DUE_NOTIFICATIONS, (time.time(), self.batch_size)) as cursor:
+                    rows = await cursor.fetchall()
+
+            if not rows:
+                return
+
+            await self._deliver(rows)
+
+    async def _deliver(self, rows):
+        stats = BroadcastStats(total=len(rows))
+        latencies = []
+        finished = []
+        pending = iter(rows)
+
+        async def worker():
+            for row in pending:
+                kwargs = {"parse_mode": row['parse_mode']} if row['parse_mode'] else {}
+                outcome = await self.broadcaster.send(row['user_id'], row['text'], stats, **kwargs)
+                finished.append(self._outcome(row, outcome, time.time(), latencies))
+                if len(finished) >= self.concurrency:
+                    await self._write_finished(finished)
+
+        sending_done = asyncio.Event()
+
+        async def flusher():
+            # Stopped by the event rather than cancelled, so a group is never
+            # rolled back halfway through its write
+            while not sending_done.is_set():
+                try:
+                    await asyncio.wait_for(sending_done.wait(), self.finish_interval)
+                except asyncio.TimeoutError:
+                    pass
+                await self._write_finished(finished)
+
+        flushing = asyncio.create_task(flusher())
+        try:
+            await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(rows)))))
+        finally:
+            sending_done.set()
+            await flushing
+        self.broadcaster.reset_chats()
+
+        stats.finished = time.monotonic()
+        logging.info(f"Giden kutusu: {stats.summary()}{latency_summary(latencies)}")
+
+    def _outcome(self, row, outcome, finished_at, latencies):
+        # (FINISH_NOTIFICATION params, user to deactivate or None)
+        attempts = row['attempts'] + 1
+
+        if outcome == SENT:
+            latencies.append(finished_at - row['created_at'])
+            return (SENT, attempts, finished_at, finished_at, row['outbox_id']), None
+        if outcome == BLOCKED:
+            return (BLOCKED, attempts, finished_at, None, row['outbox_id']), row['user_id']
+        if outcome == RETRY and attempts < self.max_attempts:
+            retry_at = finished_at + self.retry_delay * 2 ** (attempts - 1)
+            return ('pending', attempts, retry_at, None, row['outbox_id']), None
+        return (FAILED, attempts, finished_at, None, row['outbox_id']), None
+
+    async def _write_finished(self, finished):
+        # Takes everything buffered so far in one transaction
+        if not finished:
+            return
+        group = finished[:]
+        del finished[:]
+
+        async with self.pool.write() as db:
+            await db.executemany(queries.FINISH_NOTIFICATION, [update for update, _ in group])
+            await db.executemany(queries.DEACTIVATE_USER, [(user_id,) for _, user_id in group if user_id is not None])
+
+    async def stop(self):
+        # Lets the batch in flight finish; the rest waits for the next start
+        self._closing = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def latency_summary(latencies):
+    if not latencies:
+        return ""
+    return (
+        f", gecikme p50 {percentile(latencies, 0.5):.1f} sn, "
+        f"p95 {percentile(latencies, 0.95):.1f} sn, en fazla {max(latencies):.1f} sn"
+    )
+
+
+def report(conn):
+    # Per (kind, date): row count by status and the delivery latency of sent rows
+    groups = {}
+    for kind, date, status, created_at, sent_at in conn.execute(
+        "SELECT kind, date, status, created_at, sent_at FROM outbox ORDER BY date, kind"
+    ):
+        group = groups.setdefault((kind, date), {"statuses": {}, "latencies": []})
+        group["statuses"][status] = group["statuses"].get(status, 0) + 1
+        if sent_at is not None:
+            group["latencies"].append(sent_at - created_at)
+
+    return groups
+
+
+if __name__ == "__main__":
+    # Usage: python outbox.py [db]
+    conn = sqlite3.connect(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_DB)
+
+    for (kind, date), group in report(conn).items():
+        statuses = ", ".join(f"{status}: {count}" for status, count in sorted(group["statuses"].items()))
+        print(f"{date} {kind}: {statuses}{latency_summary(group['latencies'])}")
+
+    conn.close()
@@ -1,147 +1,319 @@
 import pandas as pd
+import numpy as np
+import argparse
+import glob
 import re
 import os
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from openpyxl import load_workbook
+from openpyxl.utils.cell import range_boundaries
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-EXCEL_PATH = os.path.join(BASE_DIR, "data", "Dönem 3 Bahar Dönemi .xlsx") 
-OUTPUT_PATH = os.path.join(BASE_DIR, "data", "clean_data.csv") 
+from normalize import normalize_cell
+from schedule_file import write_schedule
 
-data = pd.read_excel(EXCEL_PATH,sheet_name=None,header=None)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(os.path.dirname(BASE_DIR), "data")
+OUTPUT_PATH = os.path.join(DATA_DIR, "clean_data.parquet")
 
 except_sheets = ["SINAV","GÖZLEM","SORUMLU","TATİL"]
-clean_data = []
 
-def normalize_name(text):
+date_pattern = r'\d{4}-\d{2}-\d{2}'
+clock_pattern = r'\d{2}:\d{2}-\d{2}:\d{2}'
+
+# Lectures are only read from the first columns of the sheet
+MAX_LECTURE_COLUMN = 6
+
+def sheet_to_text(df):
+    # Every cell as its stripped str() form, exactly what the old
+    # cell-by-cell loop saw ('nan' for empty cells)
+    cells = np.frompyfunc(str, 1, 1)(df.to_numpy(dtype=object))
+    return np.char.strip(cells.astype(str))
+
+def contains(cells, pattern):
+    flat = pd.Series(cells.ravel(), dtype=object)
+    return flat.str.contains(pattern, regex=True).to_numpy(dtype=bool).reshape(cells.shape)
+
+def find_date_columns(cells):
+
+    date_mask = contains(cells, date_pattern)
+    date_rows = np.flatnonzero(date_mask.any(axis=1))
+
+    if len(date_rows) == 0:
+        return -1, {}
+
+    # Later date rows overwrite earlier ones column by column, keeping the
+    # column order in which dates were first seen
+    date_columns = {}
+    for i in date_rows:
+        for column_index in np.flatnonzero(date_mask[i]):
+            extracted_date = re.search(date_pattern, cells[i, column_index]).group()
+
+            if "2024-02-11" in extracted_date:
+                extracted_date = extracted_date.replace("2024", "2026")
+
+            date_columns[int(column_index)] = extracted_date
+
+    return int(date_rows[-1]), date_columns
+
+def parse_sheet(df):
+
+    cells = sheet_to_text(df)
+    date_row_index, date_columns = find_date_columns(cells)
+
+    if not date_columns:
+        return []
+
+    body = cells[date_row_index + 1:]
+    if len(body) == 0:
+        return []
+
+    clock_rows = body[contains(body[:, :1], clock_pattern)[:, 0]]
+    if len(clock_rows) == 0:
+        return []
+
+    columns = list(date_columns.keys())
+    block = clock_rows[:, columns]
+
+    # A break row (lunch or an empty row) ends every running lecture block
+    lowered = np.char.lower(block)
+    is_break_row = ((lowered == 'nan') | (lowered == '') | (np.char.find(lowered, 'öğle') >= 0)).all(axis=1)
+
+    lecture_columns = [i for i, column_index in enumerate(columns) if column_index <= MAX_LECTURE_COLUMN]
+    block = block[:, lecture_columns]
+    empty = (block == 'nan') | (block == '')
+
+    # Forward-fill each column: a cell shows the last non-empty cell above it,
+    # unless a break row came in between
+    row_numbers = np.arange(len(block))[:, None]
+    source = np.where(~empty | is_break_row[:, None], row_numbers, -1)
+    source = np.maximum.accumulate(source, axis=0)
+    has_lecture = (source >= 0) & ~is_break_row[source.clip(min=0)]
+    has_lecture &= ~is_break_row[:, None]
+
+    lectures = np.where(has_lecture, np.take_along_axis(block, source.clip(min=0), axis=0), '')
+
+    rows, cols = np.nonzero(has_lecture)
+    dates = [date_columns[columns[lecture_columns[c]]] for c in range(len(lecture_columns))]
+
+    records = []
+    for r, c in zip(rows, cols):
+        committee, lecture, lecture_type = normalize_cell(lectures[r, c])
+        records.append({
+            "Date": dates[c],
+            "Time": clock_rows[r, 0],
+            "Committee": committee,
+            "Lecture": lecture,
+            "Type": lecture_type
+        })
+
+    return records
+
+# --- Streaming reader ---
+# openpyxl's read-only mode streams rows without building the sheet in
+# memory, but it does not expose merged cells. Lecture blocks in these
+# schedules are merged ranges, so their <mergeCell> entries are read
+# straight from the sheet XML instead.
+
+SHEET_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PACKAGE_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+def sheet_part(archive, sheet_name):
+
+    workbook = ET.fromstring(archive.read("xl/workbook.xml"))
+    rels = ET.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    targets = {rel.get("Id"): rel.get("Target") for rel in rels.iter(f"{PACKAGE_REL_NS}Relationship")}
+
+    for sheet in workbook.iter(f"{SHEET_NS}sheet"):
+        if sheet.get("name") == sheet_name:
+            target = targets[sheet.get(f"{REL_NS}id")]
+            return target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+
+    raise KeyError(sheet_name)
+
+def read_merged_ranges(path, sheet_name):
+    # (min_col, min_row, max_col, max_row) for every merged range, 1-based
+    ranges = []
 
-    if not isinstance(text, str) or text.lower() == 'nan':
-        return None, "Belirsiz"
+    with zipfile.ZipFile(path) as archive:
+        with archive.open(sheet_part(archive, sheet_name)) as part:
+            for _, element in ET.iterparse(part):
+                if element.tag == f"{SHEET_NS}mergeCell":
+                    ranges.append(range_boundaries(element.get("ref")))
+                elif element.tag == f"{SHEET_NS}row":
+                    element.clear()
 
-    first_row = text.split("\n")[0].strip()
-    clean_text = re.split(r'\s{2,}',first_row)[0].strip()
+    return ranges
 
-    committee_match = re.search(r'(KOMİTE|COMMITTEE)\s*[-]*\s*(\d+)', clean_text, re.IGNORECASE)
-    committee_num = int(committee_match.group(2)) if committee_match else None 
+def cell_text(value):
+    return "" if value is None else str(value).strip()
 
-    if "PANEL:" in clean_text.upper():
-        committee_num = 5 
-        if "/" in clean_text:
-            lecture_name = clean_text.split('/')[-1].strip()
+def iter_sheet_rows(worksheet, merged_ranges):
+    # Yields each row as a list of cell texts, with every cell of a merged
+    # range showing the range's top-left value
+
+    starting = {}
+    for min_col, min_row, max_col, max_row in merged_ranges:
+        starting.setdefault(min_row, []).append((min_col, max_col, max_row))
+
+    active = []
+
+    for row_number, values in enumerate(worksheet.iter_rows(values_only=True), start=1):
+        cells = [cell_text(value) for value in values]
+
+        for min_col, max_col, max_row in starting.pop(row_number, ()):
+            value = cells[min_col - 1] if min_col <= len(cells) else ""
+            active.append((min_col, max_col, max_row, value))
+
+        for min_col, max_col, max_row, value in active:
+            if len(cells) < max_col:
+                cells.extend([""] * (max_col - len(cells)))
+            cells[min_col - 1:max_col] = [value] * (max_col - min_col + 1)
+
+        active = [block for block in active if block[2] > row_number]
+
+        yield cells
+
+def parse_rows(rows, normalize=normalize_cell):
+    # Streaming counterpart of parse_sheet. Lecture blocks come from merged
+    # ranges, so a cell holds a lecture only if it (or its range) says so.
+    # Like parse_sheet, only the rows after the last date row count.
+    # normalize is swapped out by the benchmark to time parsing on its own.
+
+    date_columns = {}
+    records = []
+
+    for cells in rows:
+
+        dates = {i: re.search(date_pattern, text) for i, text in enumerate(cells)}
+        dates = {i: match.group() for i, match in dates.items() if match}
+
+        if dates:
+            for column_index, extracted_date in dates.items():
+                if "2024-02-11" in extracted_date:
+                    extracted_date = extracted_date.replace("2024", "2026")
+                date_columns[column_index] = extracted_date
+            records = []
+            continue
+
+        if not date_columns or not cells or not re.search(clock_pattern, cells[0]):
+            continue
+
+        row_vals = [cells[i].lower() if i < len(cells) else "" for i in date_columns]
+        if all(val == 'nan' or val == '' or 'öğle' in val for val in row_vals):
+            continue
+
+        for column_index, date in date_columns.items():
+            if column_index > MAX_LECTURE_COLUMN or column_index >= len(cells):
+                continue
+
+            content = cells[column_index]
+            if content == 'nan' or content == '':
+                continue
+
+            committee, lecture, lecture_type = normalize(content)
+
+            records.append({
+                "Date": date,
+                "Time": cells[0],
+                "Committee": committee,
+                "Lecture": lecture,
+                "Type": lecture_type
+            })
+
+    return records
+
+def is_excluded(sheet_name):
+    return any(keyword in sheet_name.upper() for keyword in except_sheets)
+
+# Workbooks already opened by this (worker) process, so later sheets of the
+# same file skip reloading it
+_open_workbooks = {}
+
+def parse_workbook_sheet(task):
+    # Runs in a worker process: one sheet of one workbook
+    path, sheet_name, term, reader = task
+
+    if (path, reader) not in _open_workbooks:
+        if reader == "stream":
+            _open_workbooks[path, reader] = load_workbook(path, read_only=True, data_only=True)
         else:
-            lecture_name = clean_text
-    
-    elif committee_num is not None:
-        lecture_name = re.sub(r'(KOMİTE|COMMITTEE)\s*[-]*\s*\d+\s*/\s*', '', clean_text, flags=re.IGNORECASE).strip()
+            _open_workbooks[path, reader] = pd.ExcelFile(path)
 
+    workbook = _open_workbooks[path, reader]
+
+    if reader == "stream":
+        rows = iter_sheet_rows(workbook[sheet_name], read_merged_ranges(path, sheet_name))
+        records = parse_rows(rows)
     else:
-        lecture_name = clean_text
+        records = parse_sheet(workbook.parse(sheet_name, header=None))
 
-    lecture_name = re.sub(r'\((P|p)$', '(P)', lecture_name)
-    lecture_name = re.sub(r'\((T|t)$', '(T)', lecture_name)
+    for record in records:
+        record["Term"] = term
+        record["Sheet"] = sheet_name
 
-    return committee_num,lecture_name
+    return records
 
-def normalize_lecture_name(lecture_name,lecture_type):
+def sheet_names(path):
+    workbook = load_workbook(path, read_only=True)
+    names = workbook.sheetnames
+    workbook.close()
+    return names
 
-    lecture_name = lecture_name.strip()
+def build_tasks(workbooks, terms, reader="stream"):
 
-    if lecture_type == "Pratik":
-        if not re.search(r'\([Pp]\)?$', lecture_name):
-            lecture_name = f"{lecture_name} (P)"
-        
-        else:
-            lecture_name = re.sub(r'\([Pp]\)?$', '(P)', lecture_name)
+    # Excluded sheets never reach a worker, so they are never parsed
+    tasks = []
+    for path, term in zip(workbooks, terms):
+        for sheet_name in sheet_names(path):
+            if not is_excluded(sheet_name):
+                tasks.append((path, sheet_name, term, reader))
 
-    return lecture_name
+    return tasks
 
-for sheet_name,df in data.items():
+def parse_workbooks(workbooks, terms, workers=None, reader="stream"):
 
-    if any(keyword in sheet_name.upper() for keyword in except_sheets):
-        continue
+    tasks = build_tasks(workbooks, terms, reader)
+    clean_data = []
 
-    print(f"--- {sheet_name} işleniyor ---")
+    # map() yields in task order, so the output does not depend on which
+    # sheet finishes first
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for (path, sheet_name, term, _), records in zip(tasks, executor.map(parse_workbook_sheet, tasks)):
+            print(f"--- {term} / {sheet_name} işlendi ({len(records)} oturum) ---")
+            clean_data.extend(records)
 
+    return pd.DataFrame(clean_data)
 
-    date_pattern = r'\d{4}-\d{2}-\d{2}'
+def default_term(path):
+    return os.path.splitext(os.path.basename(path))[0].strip()
 
-    date_row_index = -1
-    date_columns = {}
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Ders programı çalışma kitaplarını temiz veriye dönüştürür")
+    parser.add_argument("workbooks", nargs="*", help="Varsayılan: data/ altındaki tüm .xlsx dosyaları")
+    parser.add_argument("--term", action="append", default=[],
+                        help="Dönem etiketi; bir kez verilirse tüm kitaplara, her kitap için verilirse sırayla uygulanır")
+    parser.add_argument("--output", default=OUTPUT_PATH, help="Uzantısı .csv ise CSV, değilse Parquet yazılır")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--reader", choices=["stream", "pandas"], default="stream",
+                        help="stream: birleştirilmiş hücrelerle akış okuma; pandas: eski tam sayfa okuma")
+    args = parser.parse_args()
+
+    workbooks = args.workbooks or sorted(glob.glob(os.path.join(DATA_DIR, "*.xlsx")))
+
+    if len(args.term) == 1:
+        terms = args.term * len(workbooks)
+    elif len(args.term) == len(workbooks):
+        terms = args.term
+    elif not args.term:
+        terms = [default_term(path) for path in workbooks]
+    else:
+        parser.error("--term bir kez ya da her çalışma kitabı için bir kez verilmeli.")
+
+    clean = parse_workbooks(workbooks, terms, args.workers, args.reader)
+    print(clean.head(10))
 
-    for i in range(len(df)):
-
-        row_text = "".join(map(str,df.iloc[i]))
-
-        if(re.search(date_pattern,row_text)):
-            date_row_index = i
-
-            for column_index, block in enumerate(df.iloc[i]):
-                isdate = re.search(date_pattern, str(block))
-
-                if isdate:
-                    extracted_date = isdate.group()
-            
-            
-                    if "2024-02-11" in extracted_date:
-                        extracted_date = extracted_date.replace("2024", "2026")
-                
-                    date_columns[column_index] = extracted_date
-
-
-
-    clock_pattern = r'\d{2}:\d{2}-\d{2}:\d{2}'
-    
-    last_lecture_memory = {col_idx: None for col_idx in date_columns.keys()}
-
-    for i in range(date_row_index + 1, len(df)):
-        clock_block = str(df.iloc[i, 0]).strip()
-
-        if re.search(clock_pattern, clock_block):
-            
-            row_vals = [str(val).lower().strip() for val in df.iloc[i, list(date_columns.keys())]]
-            is_break_row = all(val == 'nan' or val == '' or 'öğle' in val for val in row_vals)
-
-            if is_break_row:
-                
-                for col in last_lecture_memory:
-                    last_lecture_memory[col] = None
-                continue 
-
-            for column_index, date in date_columns.items():
-                if column_index > 6:
-                    continue
-
-                content = str(df.iloc[i, column_index]).strip()
-
-                
-                if content != 'nan' and content != '':
-                    if 'Öğle Arası' in content.lower():
-                        last_lecture_memory[column_index] = None
-                    else:
-                        last_lecture_memory[column_index] = content
-                else:
-                    
-                    pass
-                
-                current_lecture = last_lecture_memory[column_index]
-                
-                
-                
-                if current_lecture:
-
-                    committee, lecture = normalize_name(current_lecture)
-                    
-                    lecture_type = "Pratik" if re.search(r'\(P\)|LAB|PRATİK|FANTOM', current_lecture.upper()) else "Teorik"
-
-                    lecture = normalize_lecture_name(lecture,lecture_type)
-                    
-                    clean_data.append({
-                        "Date": date,
-                        "Time": clock_block,
-                        "Committee": committee,
-                        "Lecture": lecture,
-                        "Type": lecture_type 
-                    })
-
-clean = pd.DataFrame(clean_data)
-print(clean.head(10))
-
-clean.to_csv(OUTPUT_PATH,index=None)
\ No newline at end of file
+    write_schedule(clean, args.output)
@@ -0,0 +1,550 @@
+import argparse
+import contextlib
+import gc
+import io
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+
+from normalize import normalize_cell
+from preprocess import (DATA_DIR, default_term, is_excluded, iter_sheet_rows, parse_rows,
+                        parse_workbooks, read_merged_ranges)
+from schedule_file import COLUMNS, write_schedule
+
+
+BASELINE_PATH = os.path.join(DATA_DIR, "preprocess_baseline.json")
+WORKDIR = os.path.join(tempfile.gettempdir(), "lectureflow_preprocess_bench")
+
+# A memory regression must also be this many MB, so a stage that barely
+# allocates does not fail on sampling noise
+MEMORY_NOISE_MB = 2
+
+# --- Synthetic workbooks ---
+# Same shape as the faculty's workbooks: one sheet per week with the week
+# number and title in row 1, dates in row 2, day names in row 3 and one row
+# per lesson hour below, Turkish days in B-F and the English copy in I-M.
+# Lecture blocks are either merged down or written into every hour, the
+# lunch row is merged across the week, and each workbook carries the
+# excluded sheets (SORUMLU, ARA TATİL, GÖZLEM, SINAV) next to the weeks.
+
+SUBJECTS = [
+    ("Patoloji", "Pathology"), ("Farmakoloji", "Pharmacology"), ("Mikrobiyoloji", "Microbiology"),
+    ("Anatomi", "Anatomy"), ("Fizyoloji", "Physiology"), ("Biyokimya", "Biochemistry"),
+    ("Histoloji", "Histology"), ("Periodontoloji", "Periodontology"), ("Ortodonti", "Orthodontics"),
+    ("Pedodonti", "Pedodontics"), ("Endodonti", "Endodontics"), ("ADÇ Cerrahisi", "Oral Surgery"),
+    ("Protetik Diş Tedavisi", "Prosthodontics"), ("Restoratif Diş Hekimliği Bilimleri", "Restorative Dentistry"),
+    ("Diş Hekimliğinde Tanı ve Teşhis", "Diagnosis in Dentistry"),
+    ("Diş Hekimliği Becerileri", "Skills of Dentistry"),
+    ("Diş Hekimliği Kliniği ve Enfeksiyon Kontrolü", "Dental Clinic and Infection Control"),
+    ("Klinik Uygulamalara Giriş", "Introduction to Clinical Practice"),
+    ("Halk Sağlığı", "Public Health"), ("Seçmeli Ders", "Elective Course"),
+]
+
+TOPIC_WORDS = [
+    "Giriş", "Temel", "Kavramlar", "Hücre", "Doku", "Enfeksiyon", "Tedavi", "Planlaması",
+    "İlaçlar", "Sistemik", "Hastalıklar", "Büyüme", "Gelişim", "Kemik", "Dişeti", "Pulpa",
+    "Çürük", "Radyografi", "Anestezi", "Cerrahi", "Protez", "Ölçü", "Model", "Analizi",
+    "Endikasyonlar", "Komplikasyonlar", "Yöntemleri", "Uygulamaları", "Patolojisi", "Mekanizmaları",
+]
+
+TEACHERS = [
+    "Dr. Öğr. Üye. Sema Güler", "Prof. Dr. Ülkem Aydın", "Doç. Dr. Zeliha Güney",
+    "Dr. Öğr. Üyesi Fatma Soysal", "Doç.Dr. Arif Yiğit Güler", "Dr. Öğr. Üye. Banu Çiçek",
+    "Öğr. Gör. Oğuz Aydoğdu", "Prof. Dr. Muzaffer Keleş", "Dr. Öğr. Üye. Esra Nur Akgül",
+]
+
+PANEL_THEMES = ["Ağrı", "Akılcı İlaç Kull.", "Enfeksiyon", "Travma"]
+
+# The spellings the workbooks actually use
+COMMITTEE_PREFIXES = ["Komite-{}/ ", "Komite -{}/ ", "Komite-{} / "]
+
+HOURS = ["08:40-09:30", "09:40-10:30", "10:40-11:30", "11:40-12:30", "12:30-13:40",
+         "13:40-14:30", "14:40-15:30", "15:40-16:30", "16:40-17:30", "17:40-18:30", "18:40-19:30"]
+LUNCH = "12:30-13:40"
+
+DAYS_TR = ["Pazartesi", "Salı", "Çarşamba", "Perşembe", "Cuma"]
+DAYS_EN = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+
+TERMS = [("GÜZ DÖNEMİ", date(2025, 9, 15)), ("BAHAR DÖNEMİ", date(2026, 2, 9))]
+
+# Column numbers (1-based): hours in A and H, days in B-F and I-M
+TR_FIRST, EN_FIRST, EN_HOURS = 2, 9, 8
+
+
+def lecture_text(rng, subject, committee, kind, topic):
+    if kind == "panel":
+        title = f"Panel: {rng.choice(PANEL_THEMES)} / {subject}"
+    elif committee is not None:
+        title = rng.choice(COMMITTEE_PREFIXES).format(committee) + subject
+    else:
+        title = subject
+
+    if kind == "pratik":
+        # Mostly "(P)", now and then the lowercase / unclosed form
+        title += rng.choice([" (P)", " (P)", " (P)", " (p", " (P"])
+        place = "Simülasyon LAB."
+    else:
+        if rng.random() < 0.1:
+            title += " (T)"
+        place = f"Sınıf AB {rng.randint(101, 131)}"
+
+    return f"{title}\n{topic}\n{rng.choice(TEACHERS)}\n{place}"
+
+
+def english_text(subject_en, committee, topic):
+    prefix = f"Committee-{committee} / " if committee is not None else ""
+    return f"{prefix}{subject_en}\n{topic}"
+
+
+def day_blocks(rng, fill):
+    # (first hour index, length) of the lecture blocks of one day; blocks
+    # are one to four hours long and never run into lunch
+    blocks = []
+    lunch = HOURS.index(LUNCH)
+
+    for first, last in ((0, lunch), (lunch + 1, len(HOURS))):
+        hour = first
+        while hour < last:
+            if rng.random() < fill:
+                length = min(rng.randint(1, 4), last - hour)
+                blocks.append((hour, length))
+                hour += length
+            else:
+                hour += 1
+
+    return blocks
+
+
+def write_week(ws, rng, week, monday, cohort, lectures, committee, fill, closed_days=()):
+    # Returns the number of lesson hours written, the sessions preprocess
+    # should find in the sheet
+    ws.cell(1, 1, f"{week}. HAFTA")
+    ws.merge_cells(start_row=1, start_column=1, end_row=3, end_column=1)
+    ws.cell(1, TR_FIRST, f"DİŞ HEKİMLİĞİ FAKÜLTESİ DÖNEM {cohort} DERS PROGRAMI")
+    ws.merge_cells(start_row=1, start_column=TR_FIRST, end_row=1, end_column=TR_FIRST + 4)
+    ws.cell(1, EN_HOURS, f"WEEK {week}")
+    ws.merge_cells(start_row=1, start_column=EN_HOURS, end_row=3, end_column=EN_HOURS)
+    ws.cell(1, EN_FIRST, f"FACULTY OF DENTISTRY YEAR {cohort} COURSE SCHEDULE")
+    ws.merge_cells(start_row=1, start_column=EN_FIRST, end_row=1, end_column=EN_FIRST + 4)
+
+    for day in range(5):
+        day_date = datetime.combine(monday + timedelta(days=day), datetime.min.time())
+        ws.cell(2, TR_FIRST + day, day_date)
+        ws.cell(2, EN_FIRST + day, day_date)
+        ws.cell(3, TR_FIRST + day, DAYS_TR[day])
+        ws.cell(3, EN_FIRST + day, DAYS_EN[day])
+
+    first_row = 4
+    for i, hour in enumerate(HOURS):
+        ws.cell(first_row + i, 1, hour)
+        ws.cell(first_row + i, EN_HOURS, hour)
+
+    lunch_row = first_row + HOURS.index(LUNCH)
+    for column in (TR_FIRST, EN_FIRST):
+        ws.cell(lunch_row, column, "Öğle Arası")
+        ws.merge_cells(start_row=lunch_row, start_column=column, end_row=lunch_row, end_column=column + 4)
+
+    sessions = 0
+    for day in range(5):
+        if day in closed_days:
+            continue
+
+        for hour, length in day_blocks(rng, fill):
+            (subject, subject_en), kind, in_committee = rng.choice(lectures)
+            if kind != "panel" and rng.random() < 0.03:
+                kind = "panel"
+            block_committee = committee if in_committee or kind == "panel" else None
+            topic = " ".join(rng.sample(TOPIC_WORDS, rng.randint(2, 4)))
+
+            texts = (
+                (TR_FIRST + day, lecture_text(rng, subject, block_committee, kind, topic)),
+                (EN_FIRST + day, english_text(subject_en, block_committee, topic)),
+            )
+            row = first_row + hour
+            merged = rng.random() < 0.5
+
+            for column, text in texts:
+                if merged:
+                    ws.cell(row, column, text)
+                    if length > 1:
+                        ws.merge_cells(start_row=row, start_column=column, end_row=row + length - 1, end_column=column)
+                else:
+                    for r in range(row, row + length):
+                        ws.cell(r, column, text)
+
+            sessions += length
+
+    return sessions
+
+
+def write_responsible(ws, rng, lectures):
+    ws.append(["Ders adı", "Sorumlu öğretim üyesi"])
+    for (subject, _), _, _ in lectures:
+        ws.append([subject, rng.choice(TEACHERS)])
+
+
+def write_observation(ws, rng, weeks):
+    # A wide attendance grid like the real GÖZLEM sheet; never parsed
+    ws.append(["Öğrenci"] + [f"{week}. hafta" for week in range(1, weeks + 1)])
+    for student in range(45):
+        ws.append([f"Öğrenci {student + 1}"] + [rng.choice(["+", "-", ""]) for _ in range(weeks)])
+
+
+def generate_workbook(path, rng, cohort, term_index, weeks, fill=0.7, committee_weeks=5):
+    # Writes one term of one cohort; returns the expected session count
+    term_name, term_start = TERMS[term_index % len(TERMS)]
+    first_week = 1 + term_index * (weeks + 3)
+    term_start += timedelta(weeks=(term_index // len(TERMS)) * 52)
+
+    subjects = rng.sample(SUBJECTS, 12)
+    lectures = []
+    for i, subject in enumerate(subjects):
+        kind = "pratik" if i % 4 == 3 else "teorik"
+        lectures.append((subject, kind, i % 3 == 0))
+
+    wb = Workbook()
+    write_responsible(wb.active, rng, lectures)
+    wb.active.title = "SORUMLU ÖĞR ELE."
+
+    sessions = 0
+    calendar_week = 0
+    for i in range(weeks):
+        week = first_week + i
+
+        # A mid-term break every eight weeks takes a calendar week of its own
+        if i and i % 8 == 0:
+            wb.create_sheet("ARA TATİL" if i == 8 else f"ARA TATİL {i // 8}").append([None])
+            calendar_week += 1
+
+        name = str(week)
+        closed_days = ()
+        if i % 8 == 5:
+            name, closed_days = f"{week} (Bayram)", (3, 4)
+        elif i % 8 == 7:
+            name = f"{week} (Arasınav Haftası)"
+
+        monday = term_start + timedelta(weeks=calendar_week)
+        committee = 1 + i // committee_weeks
+        written = write_week(wb.create_sheet(name), rng, week, monday, cohort, lectures, committee,
+                             fill, closed_days)
+        # Like the real "Arasınav Haftası" sheets, exam weeks are skipped by preprocess
+        if not is_excluded(name):
+            sessions += written
+        calendar_week += 1
+
+    wb.create_sheet("SINAV").append(["Final sınavları"])
+    write_observation(wb.create_sheet("GÖZLEM"), rng, weeks)
+    wb.save(path)
+    return sessions
+
+
+def generate(workdir, cohorts, terms, weeks, seed=0, fill=0.7):
+    # Writes cohorts x terms workbooks and a manifest with their expected
+    # session counts; returns the manifest
+    os.makedirs(workdir, exist_ok=True)
+    rng = random.Random(seed)
+    manifest = {"cohorts": cohorts, "terms": terms, "weeks": weeks, "seed": seed, "fill": fill, "sessions": {}}
+
+    for cohort in range(1, cohorts + 1):
+        for term_index in range(terms):
+            term_name, _ = TERMS[term_index % len(TERMS)]
+            path = os.path.join(workdir, f"D-{cohort} {term_name} {term_index + 1}.xlsx")
+            manifest["sessions"][path] = generate_workbook(path, rng, cohort, term_index, weeks, fill)
+
+    with open(os.path.join(workdir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    return manifest
+
+
+def load_manifest(workdir):
+    path = os.path.join(workdir, "manifest.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# --- Measurement ---
+
+def current_rss():
+    # Resident set size in bytes; /proc is Linux only, elsewhere the
+    # process peak so far is the best there is
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class PeakRss:
+    # Samples the resident set size on a thread while a stage runs; growth
+    # is the peak above the size at the start
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.start = 0
+        self.peak = 0
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._done.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __enter__(self):
+        self.start = self.peak = current_rss()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._done.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+    @property
+    def growth(self):
+        return self.peak - self.start
+
+
+def measure(name, results, func, rows, cells):
+    # Runs func, then stores its time and throughput under name. rows and
+    # cells count the stage's input once func has returned.
+    started = time.perf_counter()
+    output = func()
+    elapsed = time.perf_counter() - started
+
+    rows, cells = rows(output), cells(output)
+    previous = results.get(name)
+    stage = {
+        "seconds": round(elapsed, 4),
+        "rows": rows,
+        "cells": cells,
+        "rows_per_s": round(rows / elapsed, 1) if elapsed else None,
+        "cells_per_s": round(cells / elapsed, 1) if elapsed else None,
+    }
+    # Over repeats the fastest run counts
+    if previous is None or previous["seconds"] > stage["seconds"]:
+        results[name] = stage
+    return output
+
+
+def stage_growth(name, inputs):
+    # Runs in the child process, after its input has been unpickled
+    gc.collect()
+    with PeakRss() as rss:
+        STAGES[name](*inputs)
+    return rss.growth
+
+
+def stage_memory(name, *inputs):
+    # RSS growth of one stage over its input, in a fresh process. In this
+    # process the stage would reuse memory freed by earlier stages and runs,
+    # or be charged for what they still hold.
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        growth = executor.submit(stage_growth, name, inputs).result()
+    return round(growth / 2 ** 20, 1)
+
+
+def memory_profile(workbooks, terms, output_path):
+    # Each stage gets the previous stage's output, built here
+    growth = {"read": stage_memory("read", workbooks)}
+    sheets = read_stage(workbooks)
+    growth["parse"] = stage_memory("parse", sheets, terms)
+    records = parse_stage(sheets, terms)
+    del sheets
+    growth["normalize"] = stage_memory("normalize", records)
+    normalize_stage(records)
+    growth["write"] = stage_memory("write", records, output_path)
+    return growth
+
+
+def raw_cell(text):
+    # Stand-in for normalize_cell while the parse stage is timed
+    return None, text, None
+
+
+def read_stage(workbooks):
+    sheets = []
+    for path in workbooks:
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        for sheet_name in workbook.sheetnames:
+            if not is_excluded(sheet_name):
+                rows = list(iter_sheet_rows(workbook[sheet_name], read_merged_ranges(path, sheet_name)))
+                sheets.append((path, sheet_name, rows))
+        workbook.close()
+    return sheets
+
+
+def parse_stage(sheets, terms):
+    records = []
+    for path, sheet_name, rows in sheets:
+        for record in parse_rows(rows, normalize=raw_cell):
+            record["Term"] = terms[path]
+            record["Sheet"] = sheet_name
+            records.append(record)
+    return records
+
+
+def normalize_stage(records):
+    # Cold cache, as in a fresh worker process
+    normalize_cell.cache_clear()
+    for record in records:
+        record["Committee"], record["Lecture"], record["Type"] = normalize_cell(record["Lecture"])
+    return records
+
+
+def write_stage(records, path):
+    write_schedule(pd.DataFrame(records), path)
+    return records
+
+
+STAGES = {"read": read_stage, "parse": parse_stage, "normalize": normalize_stage, "write": write_stage}
+
+
+def benchmark(workbooks, terms, repeat=1, workers=None):
+    results = {}
+    output_path = os.path.join(tempfile.gettempdir(), "lectureflow_bench.parquet")
+
+    for _ in range(repeat):
+        sheets = measure("read", results, lambda: read_stage(workbooks),
+                         lambda s: sum(len(rows) for _, _, rows in s),
+                         lambda s: sum(len(row) for _, _, rows in s for row in rows))
+        records = measure("parse", results, lambda: parse_stage(sheets, terms),
+                          lambda _: sum(len(rows) for _, _, rows in sheets),
+                          lambda _: sum(len(row) for _, _, rows in sheets for row in rows))
+        del sheets
+        measure("normalize", results, lambda: normalize_stage(records), len, len)
+        measure("write", results, lambda: write_stage(records, output_path),
+                len, lambda r: len(r) * len(COLUMNS))
+        del records
+
+        # The whole preprocess run with its worker processes, for reference;
+        # the workers' memory is not sampled
+        with contextlib.redirect_stdout(io.StringIO()):
+            measure("pipeline", results,
+                    lambda: parse_workbooks(workbooks, [terms[path] for path in workbooks], workers),
+                    len, len)
+
+    for name, growth in memory_profile(workbooks, terms, output_path).items():
+        results[name]["rss_growth_mb"] = growth
+    results["pipeline"]["rss_growth_mb"] = None
+    os.remove(output_path)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    # Prints each stage against the baseline; returns the regressed stages.
+    # Slower by more than tolerance (a fraction) or more memory growth by more
+    # than tolerance (and MEMORY_NOISE_MB) counts as a regression. Baselines
+    # from before growth was measured are compared on speed only.
+    regressions = []
+
+    for name, current in results.items():
+        previous = baseline.get("stages", {}).get(name)
+        if not previous:
+            continue
+
+        if (previous["rows"], previous["cells"]) != (current["rows"], current["cells"]):
+            print(f"{name}: iş yükü temel ölçümden farklı, karşılaştırılmadı")
+            continue
+
+        speed = current["rows_per_s"] / previous["rows_per_s"] - 1
+        line = f"{name}: {previous['rows_per_s']} -> {current['rows_per_s']} satır/sn ({speed * 100:+.1f}%)"
+        regressed = speed < -tolerance
+
+        before, after = previous.get("rss_growth_mb"), current["rss_growth_mb"]
+        if before is not None and after is not None:
+            line += f", bellek artışı {before} -> {after} MB"
+            regressed = regressed or (after - before > max(before * tolerance, MEMORY_NOISE_MB))
+
+        if regressed:
+            regressions.append(name)
+            line += "  <-- GERİLEME"
+        print(line)
+
+    return regressions
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Ön işleme hattının aşama aşama hız ve bellek ölçümü")
+    parser.add_argument("workbooks", nargs="*", help="Ölçülecek çalışma kitapları; verilmezse sentetik kitaplar üretilir")
+    parser.add_argument("--workdir", default=WORKDIR, help="Sentetik kitapların yazılacağı dizin")
+    parser.add_argument("--cohorts", type=int, default=6, help="Dönem (sınıf) sayısı")
+    parser.add_argument("--terms", type=int, default=2, help="Sınıf başına yarıyıl (kitap) sayısı")
+    parser.add_argument("--weeks", type=int, default=18, help="Kitap başına hafta sayısı")
+    parser.add_argument("--fill", type=float, default=0.7, help="Bir ders saatinde ders başlama olasılığı")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--generate-only", action="store_true", help="Sadece sentetik kitapları yaz")
+    parser.add_argument("--repeat", type=int, default=3, help="Tekrar sayısı; en hızlı çalışma raporlanır")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default="preprocess_bench.json")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Bu çalışmayı temel ölçüm olarak kaydet")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="İzin verilen kötüleşme oranı")
+    args = parser.parse_args()
+
+    manifest = None
+    if args.workbooks:
+        workbooks = args.workbooks
+    else:
+        wanted = {"cohorts": args.cohorts, "terms": args.terms, "weeks": args.weeks,
+                  "seed": args.seed, "fill": args.fill}
+        manifest = load_manifest(args.workdir)
+        if manifest is None or any(manifest[key] != value for key, value in wanted.items()):
+            started = time.perf_counter()
+            manifest = generate(args.workdir, args.cohorts, args.terms, args.weeks, args.seed, args.fill)
+            print(f"{len(manifest['sessions'])} sentetik kitap yazıldı: {args.workdir} "
+                  f"({time.perf_counter() - started:.1f} sn)")
+        workbooks = list(manifest["sessions"])
+
+    if args.generate_only:
+        sys.exit(0)
+
+    terms = {path: default_term(path) for path in workbooks}
+    results = benchmark(workbooks, terms, args.repeat, args.workers)
+
+    for name, stage in results.items():
+        memory = f", bellek artışı {stage['rss_growth_mb']} MB" if stage["rss_growth_mb"] is not None else ""
+        print(f"{name}: {stage['seconds']} sn, {stage['rows_per_s']} satır/sn, "
+              f"{stage['cells_per_s']} hücre/sn{memory}")
+
+    if manifest is not None:
+        expected = sum(manifest["sessions"].values())
+        if results["normalize"]["rows"] != expected:
+            print(f"UYARI: {expected} oturum bekleniyordu, {results['normalize']['rows']} bulundu.")
+            sys.exit(1)
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "workbooks": [os.path.basename(path) for path in workbooks],
+        "config": vars(args),
+        "stages": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Sonuçlar {args.output} dosyasına yazıldı.")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Temel ölçüm {args.baseline} dosyasına kaydedildi.")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            if compare(results, json.load(f), args.tolerance):
+                sys.exit(1)
+    else:
+        print(f"Temel ölçüm yok ({args.baseline}); --save-baseline ile oluşturulabilir.")
@@ -0,0 +1,28 @@
+class ProgramCache:
+    # The daily program message only depends on the date and the view
+    # (today's or tomorrow's header), yet hundreds of students ask for the
+    # same one every morning. Rendered texts are kept per (date, view) and
+    # thrown away when the schedule generation moves or the date is past.
+
+    def __init__(self, schedule, render):
+        self.schedule = schedule
+        self.render = render
+        self.generation = None
+        self.messages = {}
+
+    def get(self, date_str, view):
+        if self.generation != self.schedule.generation:
+            self.messages = {}
+            self.generation = self.schedule.generation
+
+        key = (date_str, view)
+        text = self.messages.get(key)
+        if text is None:
+            text = self.messages[key] = self.render(date_str, view)
+        return text
+
+    def warm(self, today, entries):
+        # Drops the days before today and renders entries, (date, view) pairs
+        self.messages = {key: text for key, text in self.messages.items() if key[0] >= today}
+        for date_str, view in entries:
+            self.get(date_str, view)
@@ -0,0 +1,172 @@
+# SQL used by the bot. Kept in one place so migrations.py can run
+# EXPLAIN QUERY PLAN over every statement and catch full table scans.
+
+ALL_LESSONS = """
+    SELECT lesson_id, date, time, committee, lecture_name, type, lecture_id
+    FROM lessons WHERE removed = 0
+"""
+
+SCHEDULE_GENERATION = "SELECT value FROM meta WHERE key = 'schedule_generation'"
+
+BUMP_SCHEDULE_GENERATION = "UPDATE meta SET value = value + 1 WHERE key = 'schedule_generation'"
+
+SAVE_ATTENDANCE = """
+    INSERT INTO attendance (user_id, lesson_id, status) VALUES (?, ?, ?)
+    ON CONFLICT (user_id, lesson_id) DO UPDATE SET status = excluded.status
+"""
+
+DAY_STATUSES = """
+    SELECT a.lesson_id, a.status FROM lessons l
+    JOIN attendance a ON a.lesson_id = l.lesson_id AND a.user_id = ?
+    WHERE l.date = ?
+"""
+
+# Attendance can be marked before /start; the attendance row needs its user
+ENSURE_USER = "INSERT INTO users (user_id) VALUES (?) ON CONFLICT (user_id) DO NOTHING"
+
+# Every lesson a user has marked, for the attendance calendar's day bits
+USER_MARKED_LESSONS = "SELECT lesson_id FROM attendance WHERE user_id = ?"
+
+REGISTER_USER = """
+    INSERT INTO users (user_id, username) VALUES (?, ?)
+    ON CONFLICT (user_id) DO UPDATE SET username = excluded.username, is_active = 1
+    RETURNING reminder_minute, reminders
+"""
+
+DEACTIVATE_USER = "UPDATE users SET is_active = 0 WHERE user_id = ?"
+
+REMINDER_SETTINGS = "SELECT user_id, reminder_minute FROM users WHERE is_active = 1 AND reminders = 1"
+
+# Params: reminder_minute (NULL = default time), reminders (0 = opted out), user_id
+SET_REMINDER = "UPDATE users SET reminder_minute = ?, reminders = ? WHERE user_id = ?"
+
+LECTURES_BY_COMMITTEE = """
+    SELECT lecture_id, name, type FROM lectures
+    WHERE committee IS ? AND planned_hours > 0
+    ORDER BY name
+"""
+
+LECTURE_STATUS = """
+    SELECT l.lecture_id, l.name, l.type, l.planned_hours, l.max_absent,
+           IFNULL(c.attended, 0) as attended, IFNULL(c.missed, 0) as missed
+    FROM lectures l
+    LEFT JOIN attendance_counters c ON c.lecture_id = l.lecture_id AND c.user_id = ?
+    WHERE l.lecture_id = ?
+"""
+
+USER_COUNTERS = "SELECT lecture_id, attended, missed FROM attendance_counters WHERE user_id = ?"
+
+# Attended marks on lessons after a date. The counters include them, as
+# the calendar lets students mark upcoming days. CROSS JOIN keeps the user's
+# attendance rows as the outer loop. Params: user_id, date
+USER_UPCOMING_ATTENDED = """
+    SELECT l.lecture_id, COUNT(*) AS attended FROM attendance a
+    CROSS JOIN lessons l ON l.lesson_id = a.lesson_id
+    WHERE a.user_id = ? AND a.status = 1 AND l.date > ? AND l.removed = 0
+    GROUP BY l.lecture_id
+"""
+
+LECTURE_LIMITS = "SELECT lecture_id, max_absent FROM lectures WHERE planned_hours > 0"
+
+LECTURE_MISSED = "SELECT missed FROM attendance_counters WHERE user_id = ? AND lecture_id = ?"
+
+# Params: user_id, lecture_id, threshold, fired_at
+RECORD_ABSENCE_ALERT = """
+    INSERT INTO absence_alerts (user_id, lecture_id, threshold, fired_at) VALUES (?, ?, ?, ?)
+    ON CONFLICT DO NOTHING
+"""
+
+# Every active user with unmarked lessons between two dates (inclusive),
+# one row per (user, day). Params: start, end, start, end
+MISSING_ATTENDANCE = """
+    WITH expected AS (
+        SELECT date, COUNT(*) AS total FROM lessons
+        WHERE date BETWEEN ? AND ? AND removed = 0
+        GROUP BY date
+    ),
+    filled AS (
+        SELECT a.user_id, l.date, COUNT(*) AS filled
+        FROM lessons l
+        CROSS JOIN attendance a ON a.lesson_id = l.lesson_id  -- CROSS pins lessons as the outer loop
+        WHERE l.date BETWEEN ? AND ? AND l.removed = 0
+        GROUP BY a.user_id, l.date
+    )
+    SELECT u.user_id, e.date, e.total - COALESCE(f.filled, 0) AS missing
+    FROM users u
+    CROSS JOIN expected e
+    LEFT JOIN filled f ON f.user_id = u.user_id AND f.date = e.date
+    WHERE u.is_active = 1 AND COALESCE(f.filled, 0) < e.total
+"""
+
+
+# One notification per (user, kind, date): enqueueing the same day twice,
+# e.g. after a restart, leaves the existing row alone.
+# Params: user_id, kind, date, text, parse_mode, created_at, next_attempt_at
+ENQUEUE_NOTIFICATION = """
+    INSERT INTO outbox (user_id, kind, date, text, parse_mode, created_at, next_attempt_at, expires)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (user_id, kind, date) DO NOTHING
+"""
+
+DUE_NOTIFICATIONS = """
+    SELECT outbox_id, user_id, text, parse_mode, attempts, created_at FROM outbox
+    WHERE status = 'pending' AND next_attempt_at <= ?
+    ORDER BY next_attempt_at
+    LIMIT ?
+"""
+
+NEXT_NOTIFICATION_AT = "SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'"
+
+# Params: status, attempts, next_attempt_at, sent_at, outbox_id
+FINISH_NOTIFICATION = """
+    UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, sent_at = ?
+    WHERE outbox_id = ?
+"""
+
+# Pending rows past their expires day are not sent after an outage;
+# yesterday's reminder is no use today. Params: today
+EXPIRE_NOTIFICATIONS = """
+    UPDATE outbox SET status = 'expired' WHERE status = 'pending' AND expires < ?
+    RETURNING user_id, kind, date
+"""
+
+# Schedule changes recorded by an import and not announced yet
+PENDING_SCHEDULE_CHANGES = """
+    SELECT change_id, kind, old_name, old_date, old_time, new_name, new_date, new_time
+    FROM schedule_changes WHERE notified = 0
+    ORDER BY change_id
+"""
+
+# Who hears about which pending change: active users with attendance in a
+# lecture the change touches, for changes with a side today or later. CROSS
+# JOIN keeps the few pending changes as the outer loop, each looking up its
+# lectures' users in idx_attendance_counters_lecture.
+# Params: today, today
+SCHEDULE_CHANGE_RECIPIENTS = """
+    SELECT DISTINCT ac.user_id, c.change_id
+    FROM schedule_changes c
+    CROSS JOIN attendance_counters ac ON ac.lecture_id IN (c.old_lecture_id, c.new_lecture_id)
+    JOIN users u ON u.user_id = ac.user_id AND u.is_active = 1
+    WHERE c.notified = 0 AND (c.old_date >= ? OR c.new_date >= ?)
+"""
+
+# Params: the last change_id that was fanned out
+MARK_SCHEDULE_CHANGES_NOTIFIED = "UPDATE schedule_changes SET notified = 1 WHERE notified = 0 AND change_id <= ?"
+
+
+# Statements that are expected to read every row of a table. MISSING_ATTENDANCE
+# has to visit every active user, since a user with no attendance rows at all
+# is missing every lesson. The schedule change queries scan the partial index
+# of pending changes, which is empty between imports, and EXPIRE_NOTIFICATIONS
+# the partial index of pending outbox rows.
+FULL_SCAN_OK = {
+    "ALL_LESSONS", "LECTURE_LIMITS", "MISSING_ATTENDANCE", "REMINDER_SETTINGS",
+    "PENDING_SCHEDULE_CHANGES", "SCHEDULE_CHANGE_RECIPIENTS", "EXPIRE_NOTIFICATIONS",
+}
+
+
+def bot_queries():
+    return {
+        name: value for name, value in globals().items()
+        if name.isupper() and isinstance(value, str)
+    }
@@ -0,0 +1,80 @@
+import re
+
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def spread_offset(user_id, window):
+    # A fixed offset in [0, window) per user, so users without a chosen time
+    # are spread evenly over the window and each is reminded at the same
+    # time every day (Knuth's multiplicative hash of the id)
+    if window <= 0:
+        return 0
+    return (user_id * 2654435761) % 2 ** 32 % window
+
+
+def parse_time(text):
+    # "18:30" or "18.30" -> minute of day, None if it is not a valid time
+    match = re.fullmatch(r'(\d{1,2})[:.](\d{2})', text.strip())
+    if not match:
+        return None
+
+    hour, minute = int(match.group(1)), int(match.group(2))
+    if hour > 23 or minute > 59:
+        return None
+    return hour * 60 + minute
+
+
+def format_minute(minute):
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+class ReminderIndex:
+    # Minute of day -> users to remind in that minute. Users who picked a
+    # time are bucketed there; everyone else is spread over `jitter` minutes
+    # from the default time. Opted-out users are in no bucket.
+
+    def __init__(self, default_minute, jitter=0):
+        self.default_minute = default_minute
+        self.jitter = jitter
+        self.buckets = {}
+        self.user_minute = {}
+
+    def minute_for(self, user_id, reminder_minute=None):
+        if reminder_minute is not None:
+            return reminder_minute
+        return (self.default_minute + spread_offset(user_id, self.jitter)) % MINUTES_PER_DAY
+
+    def set(self, user_id, reminder_minute=None, enabled=True):
+        # Returns the minute the user is now reminded at, None if opted out
+        self.remove(user_id)
+        if not enabled:
+            return None
+
+        minute = self.minute_for(user_id, reminder_minute)
+        self.buckets.setdefault(minute, set()).add(user_id)
+        self.user_minute[user_id] = minute
+        return minute
+
+    def remove(self, user_id):
+        minute = self.user_minute.pop(user_id, None)
+        if minute is None:
+            return
+
+        bucket = self.buckets[minute]
+        bucket.discard(user_id)
+        if not bucket:
+            del self.buckets[minute]
+
+    def load(self, rows):
+        # rows: (user_id, reminder_minute) of every user who wants reminders
+        self.buckets = {}
+        self.user_minute = {}
+        for user_id, reminder_minute in rows:
+            self.set(user_id, reminder_minute)
+
+    def enabled(self, user_id):
+        return user_id in self.user_minute
+
+    def due(self, minute):
+        return sorted(self.buckets.get(minute, ()))
@@ -0,0 +1,80 @@
+import logging
+from bisect import bisect_right
+from collections import namedtuple
+
+import queries
+
+
+Lesson = namedtuple("Lesson", "lesson_id date time committee lecture_name type lecture_id")
+
+
+class ScheduleCache:
+    # The lessons table only changes when database_setup imports a new
+    # schedule, so the bot keeps a full copy in memory: one time-sorted tuple
+    # per date and a lesson_id index. database_setup bumps the
+    # schedule_generation counter in meta; refresh() reloads when it moves.
+
+    def __init__(self):
+        self.generation = None
+        self.by_date = {}
+        self.by_id = {}
+        self.lecture_dates = {}
+        self.lecture_names = {}
+        self.max_absent = {}
+
+    async def load(self, db):
+        generation = await read_generation(db)
+
+        async with db.execute(queries.ALL_LESSONS) as cursor:
+            rows = await cursor.fetchall()
+
+        async with db.execute(queries.LECTURE_LIMITS) as cursor:
+            max_absent = {row['lecture_id']: row['max_absent'] for row in await cursor.fetchall()}
+
+        by_date = {}
+        by_id = {}
+        lecture_dates = {}
+        lecture_names = {}
+        for row in rows:
+            lesson = Lesson(*row)
+            by_date.setdefault(lesson.date, []).append(lesson)
+            by_id[lesson.lesson_id] = lesson
+            lecture_dates.setdefault(lesson.lecture_id, []).append(lesson.date)
+            lecture_names[lesson.lecture_id] = lesson.lecture_name
+
+        for date, lessons in by_date.items():
+            lessons.sort(key=lambda l: (l.time, l.lesson_id))
+            by_date[date] = tuple(lessons)
+
+        for dates in lecture_dates.values():
+            dates.sort()
+
+        # Swap in one go so readers never see a half-built cache
+        self.by_date, self.by_id = by_date, by_id
+        self.lecture_dates, self.lecture_names = lecture_dates, lecture_names
+        self.max_absent = max_absent
+        self.generation = generation
+        logging.info(f"Ders programı önbelleğe alındı: {len(by_id)} oturum, nesil {generation}")
+
+    async def refresh(self, db):
+        if await read_generation(db) == self.generation:
+            return False
+
+        await self.load(db)
+        return True
+
+    def lessons_on(self, date_str):
+        return self.by_date.get(date_str, ())
+
+    def get(self, lesson_id):
+        return self.by_id.get(lesson_id)
+
+    def occurred(self, lecture_id, date_str):
+        # Number of the lecture's sessions on or before date_str
+        return bisect_right(self.lecture_dates.get(lecture_id, ()), date_str)
+
+
+async def read_generation(db):
+    async with db.execute(queries.SCHEDULE_GENERATION) as cursor:
+        row = await cursor.fetchone()
+    return row[0] if row else 0
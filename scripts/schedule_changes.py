@@ -0,0 +1,145 @@
+from collections import namedtuple
+from datetime import date
+
+import queries
+
+
+ADDED, MOVED, CANCELLED, RENAMED = "added", "moved", "cancelled", "renamed"
+
+# old: the lessons row that went away, new: the record that came in; one of
+# them is None for added and cancelled sessions
+ScheduleChange = namedtuple("ScheduleChange", "kind old new")
+
+# A session and an added one of the same lecture further apart than this
+# are a cancellation and an unrelated extra session, not a move
+MOVE_WINDOW_DAYS = 7
+
+
+def slot(session):
+    return (session['date'], session['time'])
+
+
+def days_apart(a, b):
+    return abs((date.fromisoformat(a['date']) - date.fromisoformat(b['date'])).days)
+
+
+def classify_changes(diff, known_terms, records):
+    # Turns an import's ScheduleDiff into what a student would call it. A
+    # session is keyed by (term, date, time, name), so a moved or renamed
+    # session shows up in the diff as one removed and one added session:
+    #   moved     same lecture name, different date or time, at most
+    #             MOVE_WINDOW_DAYS away (the nearest such session)
+    #   renamed   same date and time, different name
+    # Whatever is left over was cancelled or added. Terms seen for the first
+    # time are not changes, just the new term's schedule, and a removed copy
+    # of a session that is still scheduled (left by the old append-only
+    # import) is not a cancellation; several copies of a cancelled one are
+    # one cancellation.
+
+    added = [record for record in diff.added if record['term'] in known_terms]
+    # A session flagged removed by an earlier import that is back again
+    added += [record for row, record in diff.updated if row['removed']]
+
+    by_name = {}
+    for record in sorted(added, key=slot):
+        by_name.setdefault((record['term'], record['lecture_name']), []).append(record)
+
+    scheduled = {slot(record) + (record['lecture_name'],) for record in records}
+
+    changes = []
+    unmatched = []
+    for row in sorted(diff.removed, key=slot):
+        if slot(row) + (row['lecture_name'],) in scheduled:
+            continue
+        scheduled.add(slot(row) + (row['lecture_name'],))
+
+        nearby = [
+            candidate for candidate in by_name.get((row['term'], row['lecture_name']), ())
+            if days_apart(row, candidate) <= MOVE_WINDOW_DAYS
+        ]
+        if nearby:
+            moved_to = min(nearby, key=lambda candidate: days_apart(row, candidate))
+            by_name[(row['term'], row['lecture_name'])].remove(moved_to)
+            changes.append(ScheduleChange(MOVED, row, moved_to))
+        else:
+            unmatched.append(row)
+
+    by_slot = {}
+    for candidates in by_name.values():
+        for record in candidates:
+            by_slot.setdefault((record['term'],) + slot(record), []).append(record)
+
+    for row in unmatched:
+        candidates = by_slot.get((row['term'],) + slot(row))
+        if candidates:
+            changes.append(ScheduleChange(RENAMED, row, candidates.pop(0)))
+        else:
+            changes.append(ScheduleChange(CANCELLED, row, None))
+
+    for candidates in by_slot.values():
+        changes.extend(ScheduleChange(ADDED, None, record) for record in candidates)
+
+    changes.sort(key=lambda change: slot(change.new or change.old))
+    return changes
+
+
+def record_changes(conn, generation, changes):
+    # Stored for the bot, which notifies the affected users after its next
+    # schedule reload
+    def side(session):
+        if session is None:
+            return (None, None, None, None)
+        return (session['lecture_id'], session['lecture_name'], session['date'], session['time'])
+
+    conn.executemany("""
+        INSERT INTO schedule_changes (generation, kind, old_lecture_id, old_name, old_date, old_time,
+                                      new_lecture_id, new_name, new_date, new_time)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [(generation, change.kind) + side(change.old) + side(change.new) for change in changes])
+
+
+def summarize_changes(changes):
+    counts = {kind: 0 for kind in (ADDED, MOVED, CANCELLED, RENAMED)}
+    for change in changes:
+        counts[change.kind] += 1
+    return (
+        f"{counts[MOVED]} taşınan, {counts[CANCELLED]} iptal edilen, "
+        f"{counts[RENAMED]} adı değişen, {counts[ADDED]} eklenen oturum."
+    )
+
+
+class ScheduleChangeFeed:
+    # The bot's side: pending changes and, in one join, who to tell about
+    # each. Users hear about lectures they keep attendance for, and only
+    # about changes that touch today or later.
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def pending(self, today):
+        # (last change_id, {user_id: [change rows in date order]}); the last
+        # id is None when nothing is pending
+        async with self.pool.read() as db:
+            async with db.execute(queries.PENDING_SCHEDULE_CHANGES) as cursor:
+                changes = {row['change_id']: row for row in await cursor.fetchall()}
+
+            if not changes:
+                return None, {}
+
+            async with db.execute(queries.SCHEDULE_CHANGE_RECIPIENTS, (today, today)) as cursor:
+                recipients = await cursor.fetchall()
+
+        per_user = {}
+        for user_id, change_id in recipients:
+            # Rows recorded after the first query are left for the next round
+            if change_id in changes:
+                per_user.setdefault(user_id, []).append(changes[change_id])
+
+        for user_changes in per_user.values():
+            user_changes.sort(key=lambda row: (row['new_date'] or row['old_date'], row['new_time'] or row['old_time']))
+
+        return max(changes), per_user
+
+    async def mark_notified(self, last_change_id):
+        async with self.pool.write() as db:
+            await db.execute(queries.MARK_SCHEDULE_CHANGES_NOTIFIED, (last_change_id,))
@@ -0,0 +1,83 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+# The artifact preprocess hands to database_setup. Parquet keeps the types:
+# dates stay dates, a missing committee stays missing instead of becoming a
+# float NaN, and the few hundred distinct lecture names are stored once.
+SCHEMA = pa.schema([
+    ("Date", pa.date32()),
+    ("Time", pa.string()),
+    ("Committee", pa.int8()),
+    ("Lecture", pa.dictionary(pa.int32(), pa.string())),
+    ("Type", pa.dictionary(pa.int8(), pa.string())),
+    ("Term", pa.dictionary(pa.int8(), pa.string())),
+    ("Sheet", pa.dictionary(pa.int16(), pa.string())),
+])
+
+# Artifact column -> lessons column
+COLUMNS = {
+    'Date': 'date',
+    'Time': 'time',
+    'Committee': 'committee',
+    'Lecture': 'lecture_name',
+    'Type': 'type',
+    'Term': 'term',
+    'Sheet': 'sheet',
+}
+
+
+def is_csv(path):
+    return str(path).lower().endswith(".csv")
+
+
+def typed_frame(df):
+
+    # Files written before multi-term ingestion have no Term/Sheet columns
+    df = df.reindex(columns=SCHEMA.names)
+
+    return df.astype({
+        "Date": "datetime64[s]",
+        "Time": "string",
+        "Committee": "Int8",
+        "Lecture": "category",
+        "Type": "category",
+        "Term": "category",
+        "Sheet": "category",
+    })
+
+
+def to_table(df):
+    return pa.Table.from_pandas(typed_frame(df), schema=SCHEMA, preserve_index=False)
+
+
+def write_schedule(df, path):
+    # CSV is only an export for people who want to read the schedule
+    if is_csv(path):
+        typed_frame(df).to_csv(path, index=False, date_format="%Y-%m-%d")
+    else:
+        pq.write_table(to_table(df), path)
+
+
+def read_table(path):
+
+    if not is_csv(path):
+        return pq.read_table(path, schema=SCHEMA)
+
+    df = pd.read_csv(path, dtype={"Time": str, "Lecture": str, "Type": str, "Term": str, "Sheet": str})
+    return to_table(df)
+
+
+def read_schedule(path):
+    # One dict per session, keyed by lessons column, holding plain Python
+    # values ready for sqlite3 (ISO date strings, int or None committees)
+
+    table = read_table(path)
+    columns = [
+        table.column(name).cast(pa.string()).to_pylist() if name == "Date" else table.column(name).to_pylist()
+        for name in SCHEMA.names
+    ]
+    names = [COLUMNS[name] for name in SCHEMA.names]
+
+    return [dict(zip(names, values)) for values in zip(*columns)]
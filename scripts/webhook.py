@@ -0,0 +1,134 @@
+import argparse
+import asyncio
+import json
+import logging
+import signal
+import time
+
+from aiohttp import ClientSession, web
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+
+class BoundedRequestHandler(SimpleRequestHandler):
+    # Telegram gets its 200 as soon as an update is accepted and the update is
+    # processed in the background, but never more than `concurrency` at once:
+    # when all slots are busy the next request waits for one, which pushes
+    # back on Telegram (or the reverse proxy) instead of piling up tasks.
+    # On shutdown new requests get a 503, so Telegram redelivers them to
+    # another worker or after the restart, and running updates are drained.
+
+    def __init__(self, dispatcher, bot, secret_token, concurrency=32, drain_timeout=30, **data):
+        super().__init__(dispatcher, bot, handle_in_background=True, secret_token=secret_token, **data)
+        self.drain_timeout = drain_timeout
+        self._slots = asyncio.Semaphore(concurrency)
+        self._accepting = True
+
+    async def handle(self, request):
+        if not self._accepting:
+            return web.Response(status=503)
+        return await super().handle(request)
+
+    async def _handle_request_background(self, bot, request):
+        update = await request.json(loads=bot.session.json_loads)
+
+        await self._slots.acquire()
+        task = asyncio.create_task(self._background_feed_update(bot=bot, update=update))
+        self._background_feed_update_tasks.add(task)
+        task.add_done_callback(self._finished)
+
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    def _finished(self, task):
+        self._background_feed_update_tasks.discard(task)
+        self._slots.release()
+        if not task.cancelled() and task.exception() is not None:
+            logging.error("Webhook güncellemesi işlenemedi", exc_info=task.exception())
+
+    async def drain(self):
+        self._accepting = False
+        running = set(self._background_feed_update_tasks)
+        if not running:
+            return
+
+        logging.info(f"{len(running)} güncellemenin bitmesi bekleniyor...")
+        _, pending = await asyncio.wait(running, timeout=self.drain_timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logging.warning(f"{len(pending)} güncelleme {self.drain_timeout} sn içinde bitmedi, iptal edildi.")
+
+    async def close(self):
+        await self.drain()
+        await super().close()
+
+
+async def run_webhook(dispatcher, bot, host, port, path, secret, concurrency=32, public_url=None):
+    # Serves until SIGINT/SIGTERM. public_url is registered with Telegram;
+    # leave it empty when the webhook is set elsewhere (several workers
+    # behind one proxy) or when updates are POSTed locally for testing.
+
+    if not secret:
+        raise RuntimeError("Webhook modu için WEBHOOK_SECRET tanımlanmalı.")
+
+    app = web.Application()
+    handler = BoundedRequestHandler(dispatcher, bot, secret_token=secret, concurrency=concurrency)
+    handler.register(app, path=path)
+    setup_application(app, dispatcher, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logging.info(f"Webhook dinleniyor: http://{host}:{port}{path}")
+
+    if public_url:
+        await bot.set_webhook(
+            public_url.rstrip("/") + path,
+            secret_token=secret,
+            allowed_updates=dispatcher.resolve_used_update_types(),
+        )
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    try:
+        await stop.wait()
+    finally:
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.remove_signal_handler(sig)
+        # Stops listening, then drains the handler (on_shutdown) and closes the bot session
+        await runner.cleanup()
+
+
+async def replay(url, secret, updates, concurrency=8):
+    # POSTs recorded updates (one JSON object per line) like Telegram would
+    slots = asyncio.Semaphore(concurrency)
+    statuses = {}
+
+    async with ClientSession(headers={"X-Telegram-Bot-Api-Secret-Token": secret}) as session:
+
+        async def post(update):
+            async with slots, session.post(url, json=update) as response:
+                statuses[response.status] = statuses.get(response.status, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(post(update) for update in updates))
+
+    return statuses, time.perf_counter() - started
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Kayıtlı güncellemeleri yerel webhook'a gönderir")
+    parser.add_argument("updates", help="Satır başına bir Telegram Update JSON'ı")
+    parser.add_argument("--url", default="http://127.0.0.1:8080/webhook")
+    parser.add_argument("--secret", required=True)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    with open(args.updates, encoding="utf-8") as f:
+        updates = [json.loads(line) for line in f if line.strip()]
+
+    statuses, elapsed = asyncio.run(replay(args.url, args.secret, updates, args.concurrency))
+    print(f"{len(updates)} güncelleme {elapsed:.2f} sn içinde gönderildi: {statuses}")
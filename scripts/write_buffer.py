@@ -0,0 +1,96 @@
+import asyncio
+import logging
+
+import queries
+
+
+class AttendanceWriteBuffer:
+    # Around 18:30 hundreds of students tap through their day at once. Instead
+    # of one transaction (and one fsync) per tap, clicks are queued, coalesced
+    # per (user_id, lesson_id) so the last tap wins, and written with a single
+    # executemany every flush_interval seconds or as soon as max_batch rows
+    # are waiting. submit() returns only after the row's batch is committed.
+
+    def __init__(self, pool, flush_interval=0.005, max_batch=500):
+        self.pool = pool
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._pending = {}
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def submit(self, user_id, lesson_id, status):
+        await self.submit_many([(user_id, lesson_id, status)])
+
+    async def submit_many(self, rows):
+        if self._closing:
+            raise RuntimeError("Yazma kuyruğu kapatıldı.")
+
+        future = asyncio.get_running_loop().create_future()
+
+        for user_id, lesson_id, status in rows:
+            entry = self._pending.setdefault((user_id, lesson_id), [status, []])
+            entry[0] = status
+            entry[1].append(future)
+
+        self._wakeup.set()
+        await future
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            # Give other taps a moment to join this batch
+            if not self._closing and len(self._pending) < self.max_batch:
+                await asyncio.sleep(self.flush_interval)
+
+            while self._pending:
+                await self._flush()
+
+            if self._closing:
+                return
+
+    async def _flush(self):
+        batch, self._pending = self._pending, {}
+        rows = [(user_id, lesson_id, status) for (user_id, lesson_id), (status, _) in batch.items()]
+
+        failed = {}
+        try:
+            await self._write(rows)
+        except Exception:
+            # One bad row must not fail every other tap in the batch: retry
+            # them one by one and fail only the callers of the rows that fail
+            logging.warning(f"Yoklama toplu yazılamadı ({len(rows)} satır), satır satır deneniyor")
+            for row in rows:
+                try:
+                    await self._write([row])
+                except Exception as e:
+                    logging.exception(f"Yoklama yazılamadı: kullanıcı {row[0]}, ders {row[1]}")
+                    failed[row[:2]] = e
+
+        for key, (_, waiting) in batch.items():
+            for future in waiting:
+                if not future.done() and key in failed:
+                    future.set_exception(failed[key])
+
+        for _, waiting in batch.values():
+            for future in waiting:
+                if not future.done():
+                    future.set_result(None)
+
+    async def _write(self, rows):
+        async with self.pool.write() as db:
+            await db.executemany(queries.ENSURE_USER, [(user_id,) for user_id in {row[0] for row in rows}])
+            await db.executemany(queries.SAVE_ATTENDANCE, rows)
+
+    async def stop(self):
+        # Drains whatever is still queued before returning
+        self._closing = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task